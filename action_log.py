@@ -0,0 +1,43 @@
+import json
+import numpy as np
+from config import *
+
+# Version of the replay format, bumped whenever the stored arrays change
+REPLAY_VERSION = 1
+
+
+# Save the action log of the current generation of a course to a .npz file, called when the generation is over
+# Besides the actions (2 bits per step) it keeps the layout, the seed and random generator state the generation
+# started with, and where each creature ended to check a replay against
+def save_replay(course, filename):
+    population = course.population
+    used_bytes = -(-int(population.action_count.max(initial=0)) // 4)
+    metadata = {
+        'version': REPLAY_VERSION,
+        'generation': course.generation,
+        'frames': course.frame,
+        'workers': course.workers,
+        'seed': course.seed,
+        'rng': course.generation_rng_state,
+        'layout': course.layout.to_dict(),
+        'config': course.config.to_dict(),
+    }
+    with open(filename, 'wb') as f:
+        np.savez_compressed(f, metadata=np.array(json.dumps(metadata)),
+                            action_log=population.action_log[:, :used_bytes], action_count=population.action_count,
+                            x=population.x, y=population.y, fitness=population.fitness,
+                            is_dead=population.is_dead, reached_goal=population.reached_goal)
+
+
+# Load a file saved by save_replay, return its metadata and arrays (the action log padded back to its full size)
+def load_replay(filename):
+    with np.load(filename) as data:
+        metadata = json.loads(str(data['metadata']))
+        if metadata.get('version') != REPLAY_VERSION:
+            raise ValueError(f"{filename} has replay version {metadata.get('version')}, expected {REPLAY_VERSION}")
+        arrays = {name: data[name] for name in data.files if name != 'metadata'}
+    config = Config(**metadata.get('config', {}))
+    action_log = np.zeros((len(arrays['action_count']), config.action_log_bytes), dtype=np.uint8)
+    action_log[:, :arrays['action_log'].shape[1]] = arrays['action_log']
+    arrays['action_log'] = action_log
+    return metadata, arrays
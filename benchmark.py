@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from config import *
+from obstacle_config import *
+from course_grid import CourseGrid
+from layouts import Layout, default_layout, random_obstacles
+
+# Draw on an offscreen surface, no window is needed
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+DEFAULT_SIZES = [100, 1000, 10000, 50000]
+# Number of random obstacles of each synthetic dense layout
+DENSE_LAYOUTS = [40, 120]
+
+
+# Random obstacles (the start and goal are kept clear) to benchmark layouts denser than OBSTACLES
+def dense_layout(count, seed=0):
+    return Layout(random_obstacles(count, np.random.default_rng(seed)), GOAL, START, f'dense-{count}')
+
+
+# Layouts benchmarked: the default course and the synthetic dense ones
+def benchmark_layouts(dense_counts):
+    return [default_layout()] + [dense_layout(count) for count in dense_counts]
+
+
+# Time fn(), and measure its peak traced memory if tracemalloc is running
+def measure(fn):
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - before if tracemalloc.is_tracing() else None
+    return seconds, peak
+
+
+# Run every phase once on a new course using a precomputed grid, return {phase: (seconds, peak bytes, extra fields)}
+def run_case(layout, grid, size, frames, q_store, draw, record):
+    from course import ObstacleCourse
+
+    phases = {}
+    course = None
+
+    def setup():
+        nonlocal course
+        course = ObstacleCourse(population_size=size, workers=1, seed=0, q_store=q_store, layout=layout, grid=grid)
+    phases['setup'] = measure(setup) + ({},)
+
+    def update():
+        for _ in range(frames):
+            course.update()
+    steps = int(course.population.steps.sum())
+    seconds, peak = measure(update)
+    steps = int(course.population.steps.sum()) - steps
+    phases['update'] = (seconds, peak, {'frames': frames, 'steps': steps,
+                                        'steps_per_sec': steps / seconds, 'frames_per_sec': frames / seconds})
+
+    if draw or record:
+        import pygame
+        pygame.init()
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+
+        # Each drawn frame follows an update like in main.py (new trails, fitness of the frame), only the draws are
+        # timed, the peak memory is the one of both
+        drawing = 0.0
+
+        def draw_frames():
+            nonlocal drawing
+            for _ in range(frames):
+                course.update()
+                start = time.perf_counter()
+                course.draw(screen)
+                drawing += time.perf_counter() - start
+        # The first draw builds the cached layers, only the following ones are timed
+        course.draw(screen)
+        _, peak = measure(draw_frames)
+        phases['draw'] = (drawing, peak, {'frames': frames, 'frames_per_sec': frames / drawing})
+
+        if record:
+            from video_utils import VideoRecorder
+            filename = os.path.join(tempfile.mkdtemp(), 'benchmark.mp4')
+
+            def record_frames():
+                recorder = VideoRecorder(filename)
+                for _ in range(frames):
+                    recorder.record(screen)
+                recorder.close()
+            seconds, peak = measure(record_frames)
+            phases['record'] = (seconds, peak, {'frames': frames, 'frames_per_sec': frames / seconds})
+            os.remove(filename)
+            os.rmdir(os.path.dirname(filename))
+
+    phases['evolve'] = measure(course.evolve) + ({},)
+    phases['reset'] = measure(course.reset_population) + ({},)
+    course.close()
+    return phases
+
+
+# Run every layout and population size, timing pass first and then a pass under tracemalloc for peak memory
+# The grid of each layout is computed once (reported as the 'grid' phase with size 0) and shared by its cases
+def run_benchmarks(layouts, sizes, frames, q_store, draw, record, memory):
+    rows = []
+    for layout in layouts:
+        grid = None
+
+        # Built without the layout cache so the time is the one of computing the tables
+        def build_grid():
+            nonlocal grid
+            grid = CourseGrid(layout.obstacles, layout.goal).precompute()
+        # Building the grid is mostly NumPy work, it is timed and traced in a single pass
+        if memory:
+            tracemalloc.start()
+        grid_phase = {'grid': measure(build_grid) + ({},)}
+        tracemalloc.stop()
+        cases = [(0, grid_phase, grid_phase)]
+
+        for size in sizes:
+            timed = run_case(layout, grid, size, frames, q_store, draw, record)
+            traced = {}
+            if memory:
+                tracemalloc.start()
+                traced = run_case(layout, grid, size, frames, q_store, draw, record)
+                tracemalloc.stop()
+            cases.append((size, timed, traced))
+
+        for size, timed, traced in cases:
+            for phase, (seconds, _, extra) in timed.items():
+                row = {'layout': layout.name, 'obstacles': len(layout.obstacles), 'size': size, 'phase': phase,
+                       'seconds': seconds}
+                row.update(extra)
+                row['peak_bytes'] = traced[phase][1] if phase in traced else None
+                rows.append(row)
+                print(format_row(row))
+    return rows
+
+
+def format_row(row):
+    line = f"{row['layout']:>10} {row['size']:>6} {row['phase']:>7}: {row['seconds'] * 1000:10.1f} ms"
+    if 'steps_per_sec' in row:
+        line += f", {row['steps_per_sec']:.0f} steps/sec"
+    if 'frames_per_sec' in row:
+        line += f", {row['frames_per_sec']:.1f} frames/sec"
+    if row['peak_bytes'] is not None:
+        line += f", peak {row['peak_bytes'] / 2 ** 20:.1f} MB"
+    return line
+
+
+# Print the speed-up of every row compared to the same row of a previous result file
+def compare(rows, filename):
+    with open(filename) as f:
+        previous = {(row['layout'], row['size'], row['phase']): row for row in json.load(f)['results']}
+    print(f"Compared to {filename}:")
+    for row in rows:
+        old = previous.get((row['layout'], row['size'], row['phase']))
+        if old is not None:
+            print(f"{row['layout']:>10} {row['size']:>6} {row['phase']:>7}: {old['seconds'] / row['seconds']:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation, evolution, drawing and recording")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="population sizes")
+    parser.add_argument("--dense", type=int, nargs="*", default=DENSE_LAYOUTS,
+                        help="number of obstacles of each synthetic dense layout")
+    parser.add_argument("--frames", type=int, default=50, help="frames updated, drawn and recorded per case")
+    parser.add_argument("--q-store", choices=["dense", "cow"], default=Q_STORE, help="Q-Table store")
+    parser.add_argument("--no-draw", action="store_true", help="skip drawing (and recording)")
+    parser.add_argument("--no-record", action="store_true", help="skip recording")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass measuring peak memory")
+    parser.add_argument("--output", help="result file (benchmarks/<date>.json by default)")
+    parser.add_argument("--compare", help="previous result file to compare against")
+    args = parser.parse_args()
+
+    rows = run_benchmarks(benchmark_layouts(args.dense), args.sizes, args.frames, args.q_store,
+                          not args.no_draw, not (args.no_draw or args.no_record), not args.no_memory)
+
+    output = args.output or os.path.join("benchmarks", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'date': time.strftime("%Y-%m-%dT%H:%M:%S"), 'python': platform.python_version(),
+                   'numpy': np.__version__, 'machine': platform.platform(), 'cpus': os.cpu_count(),
+                   'frames': args.frames, 'q_store': args.q_store, 'results': rows}, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        compare(rows, args.compare)
+
+
+if __name__ == "__main__":
+    main()
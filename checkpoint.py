@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import numpy as np
+from config import *
+from population import Population, ROW_ARRAYS
+from qstore import make_q_store, q_store_from_arrays
+from experience import ExperienceReplay
+
+# Version of the checkpoint format, bumped when stored arrays change meaning or are removed
+# Arrays and metadata added since (action log, config, experience replay) are optional: checkpoints without them
+# load with the defaults (empty action logs, the values of config.py, an empty experience buffer)
+CHECKPOINT_VERSION = 1
+
+
+# Copy the whole training state of a course into flat arrays (cheap, no serialization)
+# The arrays are a snapshot: the course can keep running while they are written
+def snapshot(course):
+    population = course.population
+    metadata = {
+        'version': CHECKPOINT_VERSION,
+        'generation': course.generation,
+        'population_size': len(population),
+        'q_store': population.q.kind,
+        'origin': list(population.origin),
+        'genes': population.genes.shape[1],
+        'config': course.config.to_dict(),
+        'frame': course.frame,
+        'fitness_frame': course.fitness_frame,
+        'best_index': course.best_index,
+        'best_fitness': course.best_fitness,
+        'creatures_reached_goal': course.creatures_reached_goal,
+        'has_best_snapshot': course.best_index is None and course.best_snapshot is not None,
+        'rng': population.rng.bit_generator.state,
+    }
+    arrays = {f'population_{name}': getattr(population, name).copy() for name in ROW_ARRAYS}
+    arrays.update({f'q_{name}': array for name, array in population.q.to_arrays().items()})
+    arrays['visited_cells'] = course.visited_cells.copy()
+    if course.experience is not None:
+        metadata['experience_rng'] = course.experience.rng.bit_generator.state
+        arrays.update({f'experience_{name}': array for name, array in course.experience.to_arrays().items()})
+
+    # The best creature when it isn't part of the population anymore, stored as a population of one
+    if metadata['has_best_snapshot']:
+        best = Population(1, *population.origin, q_store=make_q_store(1, 'dense'), genes=False, config=population.config)
+        best[0] = course.best_snapshot
+        arrays.update({f'best_{name}': getattr(best, name) for name in ROW_ARRAYS})
+        arrays.update({f'best_q_{name}': array for name, array in best.q.to_arrays().items()})
+    arrays['metadata'] = np.array(json.dumps(metadata))
+    return arrays
+
+
+# Write a snapshot to a .npz file (compressed unless compress=False, which is faster to write)
+def write_checkpoint(filename, arrays, compress=True):
+    with open(filename, 'wb') as f:
+        if compress:
+            np.savez_compressed(f, **arrays)
+        else:
+            np.savez(f, **arrays)
+
+
+# Writes checkpoints on a background thread so saving never stalls the simulation loop
+# Snapshots are taken by the caller, written to a temporary file and renamed over the checkpoint once complete
+# (an interrupted save never leaves a partial checkpoint), a newer save replaces one still waiting to be written
+class CheckpointWriter:
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = None
+        self.busy = False
+        self.closed = False
+        self.error = None
+        # Message describing the last save (shown on the HUD)
+        self.status = ''
+        self.thread = threading.Thread(target=self.write_checkpoints, daemon=True)
+        self.thread.start()
+
+    # Queue a snapshot to be written to filename
+    def save(self, filename, arrays, compress=True):
+        with self.condition:
+            self.pending = (filename, arrays, compress)
+            self.status = f"Saving {filename}..."
+            self.condition.notify_all()
+
+    # True while a snapshot is waiting or being written
+    def is_saving(self):
+        with self.condition:
+            return self.busy or self.pending is not None
+
+    # Background thread: write the queued snapshots until close() is called
+    def write_checkpoints(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                filename, arrays, compress = self.pending
+                self.pending = None
+                self.busy = True
+
+            try:
+                temporary = filename + '.tmp'
+                write_checkpoint(temporary, arrays, compress)
+                os.replace(temporary, filename)
+                generation = json.loads(str(arrays['metadata']))['generation']
+                status = f"Saved {filename} (generation {generation})"
+            except Exception as error:
+                # Failed saves are reported on the HUD, the simulation keeps running
+                self.error = error
+                status = f"Saving {filename} failed: {error}"
+            print(status)
+
+            with self.condition:
+                self.busy = False
+                if self.pending is None:
+                    self.status = status
+                self.condition.notify_all()
+
+    # Wait until every queued snapshot is written
+    def wait(self):
+        with self.condition:
+            while self.busy or self.pending is not None:
+                self.condition.wait()
+
+    # Write the queued snapshot and stop the thread
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+
+# Checkpoint file opened for reading, arrays are only read from the file when accessed
+class Checkpoint:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = np.load(filename)
+        self.metadata = json.loads(str(self.file['metadata']))
+        if self.metadata.get('version') != CHECKPOINT_VERSION:
+            self.file.close()
+            raise ValueError(f"{filename} has checkpoint version {self.metadata.get('version')}, "
+                             f"expected {CHECKPOINT_VERSION}")
+        # Parameters of the run (older checkpoints were saved with the values of config.py)
+        self.config = Config(**self.metadata.get('config', {}))
+        if self.metadata['genes'] != self.config.max_steps * 2:
+            self.file.close()
+            raise ValueError(f"{filename} was saved with {self.metadata['genes']} genes per creature, "
+                             f"its max_steps of {self.config.max_steps} gives {self.config.max_steps * 2}")
+
+    def __getitem__(self, name):
+        return self.file[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.file.close()
+
+    # Read the arrays starting with prefix (without it)
+    def arrays(self, prefix):
+        return {name[len(prefix):]: self.file[name] for name in self.file.files if name.startswith(prefix)}
+
+    # Rebuild the population (or the best creature snapshot with the 'best_' prefixes and 'dense' Q store)
+    def population(self, prefix='population_', q_prefix='q_', q_store=None, rng=None):
+        arrays = self.arrays(prefix)
+        q = q_store_from_arrays(q_store or self.metadata['q_store'], self.arrays(q_prefix))
+        population = Population(len(arrays['x']), *self.metadata['origin'], rng, q, genes=False, config=self.config)
+        # Arrays added since the checkpoint was written (e.g. the action log) are left empty
+        for name in ROW_ARRAYS:
+            if name in arrays:
+                getattr(population, name)[:] = arrays[name]
+        return population
+
+
+# Restore a course to the state of a checkpoint (the run goes on with the parameters it was saved with)
+def restore(course, filename):
+    with Checkpoint(filename) as checkpoint:
+        metadata = checkpoint.metadata
+        if checkpoint.config != course.config and course.pool is not None:
+            # Worker processes were set up with the previous parameters
+            course.pool.terminate()
+            course.pool = None
+        course.config = checkpoint.config
+        rng = np.random.default_rng()
+        rng.bit_generator.state = metadata['rng']
+        course.population = checkpoint.population(rng=rng)
+        course.population_size = metadata['population_size']
+        course.spare_population = None
+        course.generation = metadata['generation']
+        course.frame = metadata['frame']
+        course.fitness_frame = metadata['fitness_frame']
+        course.best_index = metadata['best_index']
+        course.best_fitness = metadata['best_fitness']
+        course.creatures_reached_goal = metadata['creatures_reached_goal']
+        course.visited_cells[:] = checkpoint['visited_cells']
+        course.experience = ExperienceReplay.from_config(course.config)
+        if course.experience is not None and 'experience_rng' in metadata:
+            course.experience.rng.bit_generator.state = metadata['experience_rng']
+            course.experience.load_arrays(checkpoint.arrays('experience_'))
+        course.best_snapshot = None
+        if metadata['has_best_snapshot']:
+            course.best_snapshot = checkpoint.population('best_', 'best_q_', 'dense')[0]
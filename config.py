@@ -10,7 +10,42 @@ START_EPSILON = 0.9
 MIN_EPSILON = 0.1
 DECAY = 0.9
 GOAL_REWARD = 1000
+# How the distance to the goal is measured for the rewards and fitness: 'straight' line (with a penalty for each
+# obstacle crossed) or length of the shortest 'path' around the obstacles (see CourseGrid.goal_distance)
+GOAL_DISTANCE = 'straight'
+# Shared experience replay (see experience.py): transitions of the whole population kept in a buffer of
+# EXPERIENCE_SIZE transitions (0 disables it) train a shared Q-Table on batches of EXPERIENCE_BATCH transitions every
+# frame, and with EXPERIENCE_SEEDING it fills the states creatures don't know yet when the population is reset
+EXPERIENCE_SIZE = 0
+EXPERIENCE_BATCH = 256
+EXPERIENCE_SEEDING = True
 FPS = 180
+# Simulation steps run by main.py for every drawn frame (UP/DOWN change it while running)
+STEPS_PER_FRAME = 1
+
+# Number of processes used to simulate a generation (1 runs everything in the main process)
+WORKERS = 1
+# Island model (islands.py): number of islands, each evolving its own population in a process, and how often
+# (every N generations), how much (fraction of the population sent to each neighbour) and where they migrate
+ISLANDS = 4
+MIGRATION_INTERVAL = 5
+MIGRATION_RATE = 0.01
+MIGRATION_TOPOLOGY = 'ring'
+# Seed for the random generator of the population (None picks a random seed)
+SEED = None
+# How Q-Tables are stored: 'dense' (one full table per creature) or 'cow' (rows shared copy-on-write with parents)
+Q_STORE = 'dense'
+# Checkpoint of the whole training state saved by main.py (S key, when quitting and every AUTOSAVE_EVERY generations)
+CHECKPOINT_FILE = 'checkpoint.npz'
+# Save the checkpoint in the background every N generations (0 never autosaves)
+AUTOSAVE_EVERY = 0
+# Measure the time of each phase of the training loop (shown on the HUD and saved to PROFILE_FILE, .json or .csv)
+PROFILE = False
+PROFILE_FILE = 'profile.json'
+# Directory where the precomputed grid of each course layout is cached (see layouts.py)
+LAYOUT_CACHE_DIR = 'layout_cache'
+# Directory main.py saves the action log of every generation to, to play them back with replay.py (None doesn't record)
+REPLAY_DIR = None
 
 # Colors
 WHITE = (255, 255, 255)
@@ -26,4 +61,80 @@ PURPLE = (128, 0, 128)
 # Add new constants for the recorded frame size
 RECORD_WIDTH = 800
 RECORD_HEIGHT = 600
-RECORD_SIMULATION = False
\ No newline at end of file
+RECORD_SIMULATION = False
+
+# Parameters of a run that can change without editing this file: ObstacleCourse, Population and Creature take a Config
+# (Config() has the values above, Config(mutation_rate=0.2) changes one of them)
+class Config:
+    FIELDS = ('population_size', 'mutation_rate', 'max_steps', 'learning_rate', 'discount_factor', 'start_epsilon',
+              'min_epsilon', 'decay', 'goal_reward', 'goal_distance', 'experience_size', 'experience_batch',
+              'experience_seeding')
+
+    def __init__(self, **values):
+        self.population_size = POPULATION_SIZE
+        self.mutation_rate = MUTATION_RATE
+        self.max_steps = MAX_STEPS
+        self.learning_rate = LEARNING_RATE
+        self.discount_factor = DISCOUNT_FACTOR
+        self.start_epsilon = START_EPSILON
+        self.min_epsilon = MIN_EPSILON
+        self.decay = DECAY
+        self.goal_reward = GOAL_REWARD
+        self.goal_distance = GOAL_DISTANCE
+        self.experience_size = EXPERIENCE_SIZE
+        self.experience_batch = EXPERIENCE_BATCH
+        self.experience_seeding = EXPERIENCE_SEEDING
+        for name, value in values.items():
+            if name not in Config.FIELDS:
+                raise ValueError(f"Unknown parameter {name!r}, expected one of {', '.join(Config.FIELDS)}")
+            setattr(self, name, value)
+        if self.goal_distance not in ('straight', 'path'):
+            raise ValueError(f"Unknown goal_distance {self.goal_distance!r}, expected 'straight' or 'path'")
+
+    # Parse "name=value" strings (e.g. from the command line), see convert
+    @staticmethod
+    def parse(assignments):
+        values = {}
+        for assignment in assignments:
+            name, _, value = assignment.partition('=')
+            name, value = Config.convert(name, value)
+            values[name] = value
+        return Config(**values)
+
+    # Name of a parameter as given on the command line (dashes or underscores), checked against FIELDS
+    @staticmethod
+    def field(name):
+        name = name.strip().replace('-', '_')
+        if name not in Config.FIELDS:
+            raise ValueError(f"Unknown parameter {name!r}, expected one of {', '.join(Config.FIELDS)}")
+        return name
+
+    # Name and value of a parameter given as text, the value is converted to the type of its default
+    @staticmethod
+    def convert(name, text):
+        name = Config.field(name)
+        kind = type(getattr(Config(), name))
+        if kind is bool:
+            return name, text.strip().lower() in ('1', 'true', 'yes', 'on')
+        try:
+            return name, kind(text)
+        except ValueError:
+            raise ValueError(f"Invalid value {text!r} for {name}, expected {kind.__name__}") from None
+
+    # Copy with some parameters changed
+    def replace(self, **values):
+        return Config(**{**self.to_dict(), **values})
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in Config.FIELDS}
+
+    # Bytes of the action log of a creature (2 bits per action, see creature.py)
+    @property
+    def action_log_bytes(self):
+        return -(-self.max_steps // 4)
+
+    def __eq__(self, other):
+        return isinstance(other, Config) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Config({', '.join(f'{name}={value!r}' for name, value in self.to_dict().items())})"
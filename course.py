@@ -1,222 +1,449 @@
-from creature import Creature
+from population import Population, STATE_SHAPE
+from creature import STEP_SIZE
+from qstore import make_q_store
+from profiler import Profiler
+from checkpoint import CheckpointWriter, snapshot, write_checkpoint, restore
+from action_log import save_replay
+from experience import ExperienceReplay, TRANSITION_ARRAYS
+from layouts import default_layout, load_grid
+from geometry import any_clipline_hits, count_obstacles_crossed
 from config import *
 from obstacle_config import *
-import pygame
-import math
-import random
 import pickle
 import os
+import multiprocessing
 import numpy as np
 
 # Class that represent the Obstacle Course the creature must traverse
 class ObstacleCourse:
 
     # Initialize Obstacles and the first generation
-    def __init__(self):
-        self.population = [Creature(*START) for _ in range(POPULATION_SIZE)]
-        self.obstacles = [pygame.Rect(*obs) for obs in OBSTACLES]
-        self.goal = GOAL
+    # With more than one worker, generations run by run_generation() are split across a process pool
+    # With profile=True the time of each phase is measured by self.profiler (see profiler.py)
+    # The course is the layout of obstacle_config.py unless another Layout is given (see layouts.py),
+    # its grid is loaded from the layout cache unless one is given
+    # config gives the parameters of the run (Config() by default, population_size overrides its population size)
+    def __init__(self, population_size=None, workers=WORKERS, seed=SEED, q_store=Q_STORE, profile=PROFILE,
+                 layout=None, grid=None, config=None):
+        self.config = config or Config()
+        if population_size is None:
+            population_size = self.config.population_size
+        self.population_size = population_size
+        self.profiler = Profiler(profile)
+        self.seed = seed
+        layout = layout or default_layout()
+        self.population = Population(population_size, *layout.start, np.random.default_rng(seed),
+                                     make_q_store(population_size, q_store), config=self.config)
+        # Shared experience replay of the population (None unless config.experience_size is set)
+        self.experience = ExperienceReplay.from_config(self.config, np.random.default_rng(None if seed is None else [seed, 1]))
+        # Arrays of the previous generation, reused by evolve to write the next one
+        self.spare_population = None
+        self.workers = workers
+        self.pool = None
+        self.renderer = None
+        self.checkpoint_writer = None
+        # Directory the action log of every generation is saved to (see record_replays), and the state of the
+        # random generator when the current generation started
+        self.replay_dir = None
+        self.generation_rng_state = None
+        # Logged actions played back instead of choosing actions (set by ReplayCourse in replay.py)
+        self.replay_log = None
+        # Number of updates done in the current generation, and the frame the fitness was last computed at
+        self.frame = 0
+        self.fitness_frame = 0
+        # Running count of the finished creatures of self.finished_population (see count_finished)
+        self.finished_count = 0
+        self.finished_population = None
+        self.use_layout(layout, grid=grid)
         self.generation = 0
-        self.best_creature = None
+        self.best_index = None
+        self.best_snapshot = None
         self.best_fitness = float('-inf')
-        self.visited_cells = set()
+        self.visited_cells = np.zeros(STATE_SHAPE, dtype=bool)
         self.creatures_reached_goal = 0
         self.goal_reaching_creatures = []
 
-    # Update each state
+    # Best creature so far (a live view while it is still part of the population)
+    @property
+    def best_creature(self):
+        if self.best_index is not None:
+            return self.population[self.best_index]
+        return self.best_snapshot
+
+    # Update each state (all creatures still running are stepped together)
     def update(self):
-        current_best_fitness = float('-inf')
-        current_best_creature = None
-
-        for creature in self.population:
-            if not creature.is_dead and not creature.reached_goal:
-                # Check if there's a direct path to the goal
-                creature.direct_path_to_goal = self.check_direct_path(creature, self.goal)
-                
-                old_state = creature.get_state()
-                old_x, old_y = creature.x, creature.y
-                creature.move()
-                new_state = creature.get_state()
-                
-                self.visited_cells.add(new_state)
-                
-                # Small negative reward for each step
-                reward = -1  
-                if creature.is_dead:
-                    # Large negative reward for dying
-                    reward = -100  
-                elif self.check_collision(creature, old_x, old_y):
-                    # Large negative reward for hitting an obstacle
-                    creature.is_dead = True
-                    creature.x, creature.y = old_x, old_y
-                    reward = -100  
-                elif math.hypot(creature.x - self.goal[0], creature.y - self.goal[1]) < CREATURE_SIZE:
-                    # Large positive reward for reaching the goal
-                    creature.reached_goal = True
-                    self.creatures_reached_goal += 1
-                    reward = GOAL_REWARD  
-                
+        self.frame += 1
+        profiler = self.profiler
+        profiler.end_frame()
+        population = self.population
+        idx = np.flatnonzero(~population.is_dead & ~population.reached_goal)
+        if idx.size == 0:
+            return
+        self.count_finished()
+        max_steps = self.config.max_steps
+        out_of_steps = np.count_nonzero(population.steps[idx] == max_steps)
+
+        # Check if there's a direct path to the goal
+        with profiler.phase('direct_path'):
+            population.direct_path_to_goal[idx] = self.direct_path_of(idx, population.x[idx], population.y[idx])
+
+        old_x, old_y = population.x[idx], population.y[idx]
+        with profiler.phase('move'):
+            population.move(idx, self.replay_log)
+            new_cx, new_cy = population.get_state(idx)
+
+        self.mark_visited_cells(idx, new_cx, new_cy)
+
+        # Small negative reward for each step
+        reward = np.full(idx.size, -1.0)
+        died = population.is_dead[idx]
+        # Large negative reward for dying
+        reward[died] = -100
+
+        # Large negative reward for hitting an obstacle
+        with profiler.phase('collision'):
+            collided = ~died & self.collision_of(idx, old_x, old_y, population.x[idx], population.y[idx])
+        hit = idx[collided]
+        population.is_dead[hit] = True
+        population.x[hit], population.y[hit] = old_x[collided], old_y[collided]
+        reward[collided] = -100
+
+        # Large positive reward for reaching the goal
+        goal_x, goal_y = self.goal_of(idx)
+        distance = np.hypot(population.x[idx] - goal_x, population.y[idx] - goal_y)
+        arrived = ~died & ~collided & (distance < CREATURE_SIZE)
+        population.reached_goal[idx[arrived]] = True
+        self.creatures_reached_goal += int(arrived.sum())
+        reward[arrived] = self.config.goal_reward
+
+        # Distances along the shortest path around the obstacles instead of the straight line
+        if self.config.goal_distance == 'path':
+            old_distance = self.goal_distance_of(idx, old_x, old_y)
+            distance = self.goal_distance_of(idx, population.x[idx], population.y[idx])
+
+        # Nothing is learnt when playing back a recorded generation
+        if self.replay_log is None:
+            with profiler.phase('q_update'):
                 # Penalty for staying in one place
-                stagnation_penalty = creature.calculate_stagnation_penalty() * 10
-                reward -= stagnation_penalty
-                
-                creature.update_q_table(reward, new_state)
-                
-                # Count obstacles between creature and goal (in a straight line)
-                obstacle_count = self.count_obstacles_between(creature, self.goal)
-                creature.calculate_fitness(self.goal, obstacle_count, self.visited_cells)
-
-                if creature.fitness > current_best_fitness:
-                    current_best_fitness = creature.fitness
-                    current_best_creature = creature
-
-        # Update the best creature
-        if current_best_creature and current_best_fitness > self.best_fitness:
-            self.best_fitness = current_best_fitness
-            self.best_creature = current_best_creature
-    
+                reward -= population.calculate_stagnation_penalty(idx) * 10
+
+                # Each step along the path toward the goal makes up for the step penalty, each step away doubles it
+                if self.config.goal_distance == 'path':
+                    reward[~arrived] += (old_distance - distance)[~arrived] / STEP_SIZE
+
+                population.update_q_table(idx, reward, new_cx, new_cy)
+
+            if self.experience is not None:
+                with profiler.phase('experience'):
+                    moved = population.last_action[idx] >= 0
+                    last_state = population.last_state[idx[moved]]
+                    done = died | collided | arrived
+                    self.experience.add(last_state[:, 0], last_state[:, 1], population.last_action[idx[moved]],
+                                        reward[moved], new_cx[moved], new_cy[moved], done[moved])
+                    self.experience.learn()
+
+        # Only the closest distance to the goal is kept every step, the fitness is computed when needed
+        alive = ~population.is_dead[idx]
+        population.update_closest_distance(idx[alive], distance[alive])
+        if arrived.any():
+            population.novelty_cells[idx[arrived]] = np.broadcast_to(self.visited_cell_count(idx), idx.shape)[arrived]
+
+        # Only the creatures stepped this frame can have finished
+        finished = ~alive | population.reached_goal[idx] | (population.steps[idx] == max_steps)
+        self.finished_count += int(np.count_nonzero(finished)) - out_of_steps
+
+    # Compute the fitness of every creature from its current state and update the best creature
+    # Called at the end of a generation, before evolving and when drawing (nothing to do if no frame ran since)
+    def evaluate_fitness(self):
+        if self.fitness_frame == self.frame:
+            return
+        self.fitness_frame = self.frame
+        population = self.population
+        idx = np.flatnonzero(~population.is_dead)
+        population.fitness[population.is_dead] = 0
+
+        if self.config.goal_distance == 'path':
+            # The shortest path already goes around the obstacles, none of them is counted
+            obstacle_count = 0
+            distances = (self.goal_distance_of(idx, population.x[idx], population.y[idx]),
+                         self.goal_distance_of(idx, population.initial_x[idx], population.initial_y[idx]))
+        else:
+            # Count obstacles between creature and goal (in a straight line)
+            with self.profiler.phase('obstacle_count'):
+                obstacle_count = self.obstacle_count_of(idx, population.x[idx], population.y[idx])
+            distances = None
+
+        with self.profiler.phase('fitness'):
+            population.calculate_fitness(idx, self.goal_of(idx), obstacle_count, self.visited_cell_count(idx), distances)
+
+            # Update the best creature
+            if len(population):
+                best = int(np.argmax(population.fitness))
+                if population.fitness[best] > self.best_fitness:
+                    self.best_fitness = float(population.fitness[best])
+                    self.best_index = best
+
+    # Goal of the creatures idx (every creature plays the same layout here, see LayoutBatch in layout_batch.py)
+    def goal_of(self, idx):
+        return self.goal
+
+    # Check if there's a direct path between the positions of the creatures idx and their goal
+    def direct_path_of(self, idx, x, y):
+        return self.check_direct_path_batch(x, y, self.goal)
+
+    # Check for collisions of the creatures idx moving from (old_x, old_y) to (new_x, new_y)
+    def collision_of(self, idx, old_x, old_y, new_x, new_y):
+        return self.check_collision_batch(old_x, old_y, new_x, new_y)
+
+    # Count obstacles between the positions of the creatures idx and their goal
+    def obstacle_count_of(self, idx, x, y):
+        return self.count_obstacles_between_batch(x, y, self.goal)
+
+    # Length of the shortest path around the obstacles between the positions of the creatures idx and their goal
+    def goal_distance_of(self, idx, x, y):
+        return self.grid.distance_to_goal(x, y)
+
+    # Mark the cells the creatures idx stand on as visited (shared by the whole population for the novelty score)
+    def mark_visited_cells(self, idx, cx, cy):
+        self.visited_cells[cx, cy] = True
+
+    # Number of cells visited by the population the creatures idx belong to
+    def visited_cell_count(self, idx):
+        return int(self.visited_cells.sum())
+
+    # Number of finished creatures (dead, at the goal or out of steps) of the generation, kept up to date by update()
+    # and only counted again when the population was replaced or changed elsewhere (finished_population reset to None)
+    def count_finished(self):
+        population = self.population
+        if self.finished_population is not population:
+            finished = population.is_dead | population.reached_goal | (population.steps == self.config.max_steps)
+            self.finished_count = int(np.count_nonzero(finished))
+            self.finished_population = population
+        return self.finished_count
+
+    # Check if every creature of the generation is finished
+    def is_generation_over(self):
+        return self.count_finished() == len(self.population)
+
+    # Run the current generation until every creature is finished (no drawing), return the number of frames
+    def run_generation(self):
+        if self.workers > 1:
+            return self.run_generation_parallel()
+        frames = 0
+        while not self.is_generation_over():
+            self.update()
+            frames += 1
+        self.evaluate_fitness()
+        return frames
+
+    # Run the current generation with the population split into one shard per worker process
+    # Each shard is simulated independently (its own visited cells), then results are gathered back
+    def run_generation_parallel(self):
+        if self.pool is None:
+            initargs = (self.layout, self.grid.precompute(), self.profiler.enabled, self.config)
+            self.pool = multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=initargs)
+
+        # Shard seeds come from the population generator so runs are reproducible given the seed
+        population = self.population
+        shards = np.array_split(np.arange(len(population)), self.workers)
+        seeds = population.rng.integers(2 ** 63, size=len(shards))
+        tasks = [population.subset(rows, np.random.default_rng(seed)) for rows, seed in zip(shards, seeds)]
+
+        frames = 0
+        with self.profiler.phase('shards'):
+            results = self.pool.map(_simulate_shard, tasks)
+        # Phases measured in the workers are summed over the shards
+        for rows, (shard, visited_cells, reached_goal, best_index, best_fitness, shard_frames, phases,
+                   transitions) in zip(shards, results):
+            self.profiler.merge(phases)
+            if self.experience is not None:
+                self.experience.add(*(transitions[name] for name in TRANSITION_ARRAYS))
+            population.copy_rows(rows, shard, slice(None))
+            self.visited_cells |= visited_cells
+            self.creatures_reached_goal += reached_goal
+            if best_index is not None and best_fitness > self.best_fitness:
+                self.best_fitness = best_fitness
+                self.best_index = int(rows[best_index])
+            frames = max(frames, shard_frames)
+        self.finished_population = None
+        # The workers only gather transitions, the shared Q-Table learns from them here (one batch per frame)
+        if self.experience is not None:
+            with self.profiler.phase('experience'):
+                self.experience.learn(frames)
+        self.frame += frames
+        self.fitness_frame = self.frame
+        self.profiler.end_frame(frames)
+        return frames
+
+    # Stop the worker processes and finish writing checkpoints
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.close()
+            self.checkpoint_writer = None
+
     # Check if there's a direct path between creature and goal
     def check_direct_path(self, creature, goal):
-        start = (creature.x, creature.y)
-        for obstacle in self.obstacles:
-            if obstacle.clipline(start, goal):
-                return False
-        return True
+        return bool(self.check_direct_path_batch(int(creature.x), int(creature.y), goal))
     
+    # Check if there's a direct path between many positions and goal (cached per pixel for the course goal)
+    def check_direct_path_batch(self, x, y, goal):
+        if tuple(goal) == self.grid.goal:
+            return self.grid.check_direct_path(x, y)
+        return ~any_clipline_hits(self.grid.obstacles, x, y, goal[0], goal[1])
+
     # Check for collision between Creature and Obstacle
     def check_collision(self, creature, old_x, old_y):
-        creature_rect = pygame.Rect(creature.x - CREATURE_SIZE, creature.y - CREATURE_SIZE, 
-                                    CREATURE_SIZE * 2, CREATURE_SIZE * 2)
-        for obstacle in self.obstacles:
-            if creature_rect.colliderect(obstacle):
-                return True
-        
-        for obstacle in self.obstacles:
-            if obstacle.clipline((old_x, old_y), (creature.x, creature.y)):
-                return True
-        
-        return False
+        return bool(self.grid.check_collision(old_x, old_y, int(creature.x), int(creature.y)))
     
+    # Check for collisions of many creatures moving from (old_x, old_y) to (new_x, new_y)
+    def check_collision_batch(self, old_x, old_y, new_x, new_y):
+        return self.grid.check_collision(old_x, old_y, new_x, new_y)
+
     # Count Obstacles between creature and the goal
     def count_obstacles_between(self, creature, goal):
-        def line_intersection(line1, line2):
-            x1, y1, x2, y2 = line1
-            x3, y3, x4, y4 = line2
-            
-            den = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
-            if den == 0:
-                return False
-            
-            t = ((x1 - x3) * (y3 - y4) - (y1 - y3) * (x3 - x4)) / den
-            u = -((x1 - x2) * (y1 - y3) - (y1 - y2) * (x1 - x3)) / den
-            
-            if 0 <= t <= 1 and 0 <= u <= 1:
-                return True
-            return False
-
-        count = 0
-        creature_pos = (creature.x, creature.y)
-        for obstacle in self.obstacles:
-            obstacle_lines = [
-                (obstacle.left, obstacle.top, obstacle.right, obstacle.top),
-                (obstacle.right, obstacle.top, obstacle.right, obstacle.bottom),
-                (obstacle.right, obstacle.bottom, obstacle.left, obstacle.bottom),
-                (obstacle.left, obstacle.bottom, obstacle.left, obstacle.top)
-            ]
-            
-            for line in obstacle_lines:
-                if line_intersection((*creature_pos, *goal), line):
-                    count += 1
-                    break  # Count each obstacle only once
-        
-        return count
+        return int(self.count_obstacles_between_batch(int(creature.x), int(creature.y), goal))
+
+    # Count Obstacles between many positions and the goal (cached per pixel for the course goal)
+    def count_obstacles_between_batch(self, x, y, goal):
+        if tuple(goal) == self.grid.goal:
+            return self.grid.count_obstacles_between(x, y)
+        return count_obstacles_crossed(self.grid.obstacles, x, y, goal)
+
+    # Play a Layout (obstacles, goal and start), its grid is loaded from the layout cache (see layouts.load_grid)
+    # unless one is given. The start takes effect when the population is next reset
+    def use_layout(self, layout, cache_dir=LAYOUT_CACHE_DIR, grid=None):
+        grid = grid if grid is not None else load_grid(layout, cache_dir)
+        if self.pool is not None and grid is not self.grid:
+            # Worker processes were set up with the previous grid
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.layout = layout
+        self.start = layout.start
+        self.obstacles = layout.obstacles
+        self.goal = layout.goal
+        self.grid = grid
+        # The obstacles are drawn again on the next frame
+        self.renderer = None
     
-    # Draw the scene on Pygame
+    # Draw the scene on Pygame (see renderer.py, only imported when drawing so the simulation doesn't need pygame)
     def draw(self, screen):
-        screen.fill(WHITE)
-        for obstacle in self.obstacles:
-            pygame.draw.rect(screen, BLACK, obstacle)
-        pygame.draw.circle(screen, GREEN, self.goal, CREATURE_SIZE)
-        
-        for creature in self.population:
-            if creature == self.best_creature:
-                color = BLUE  # Best creature in purple
-            elif creature.reached_goal:
-                color = YELLOW
-            elif creature.is_dead:
-                color = GRAY
-            else:
-                color = RED
-            pygame.draw.circle(screen, color, (int(creature.x), int(creature.y)), CREATURE_SIZE)
-            for point in creature.path:
-                screen.set_at(point, (255, 200, 200))
-        
-        font = pygame.font.Font(None, 36)
-        gen_text = font.render(f"Generation: {self.generation}", True, BLUE)
-        screen.blit(gen_text, (10, 10))
-        best_text = font.render(f"Best Fitness: {self.best_fitness:.4f}", True, BLUE)
-        screen.blit(best_text, (10, 50))
-        alive_text = font.render(f"Alive: {sum(1 for c in self.population if not c.is_dead)}/{POPULATION_SIZE}", True, BLUE)
-        screen.blit(alive_text, (10, 90))
-        goal_text = font.render(f"Reached Goal: {self.creatures_reached_goal}/{POPULATION_SIZE}", True, BLUE)
-        screen.blit(goal_text, (10, 130))
+        self.evaluate_fitness()
+        with self.profiler.phase('draw'):
+            if self.renderer is None:
+                from renderer import Renderer
+                self.renderer = Renderer()
+            self.renderer.draw(screen, self)
 
     # Create New Generation based on the best performing creatures (Also keep top 2 of the best performing creature)
     def evolve(self):
-        self.population.sort(key=lambda x: x.fitness, reverse=True)
-        elite = self.population[:2]
-        new_population = []
-        
-        while len(new_population) < POPULATION_SIZE - 2:
-            parent1, parent2 = random.choices(self.population[:20], k=2)
-            child = self.crossover(parent1, parent2)
-            self.mutate(child)
-            new_population.append(child)
-        
-        self.population = elite + new_population
+        self.evaluate_fitness()
+        if self.replay_dir is not None:
+            save_replay(self, os.path.join(self.replay_dir, f"generation_{self.generation:05d}.npz"))
+        with self.profiler.phase('evolve'):
+            self.evolve_population()
+        # Evolving closes the profile of the generation (the reset is counted in the next one)
+        self.profiler.end_generation(self.generation - 1)
+
+    # Replace the population by its children (see evolve), written in place into the spare population
+    def evolve_population(self):
+        population = self.population
+        order = np.argsort(-population.fitness, kind='stable')
+        new_population = self.spare_population
+        if new_population is None or len(new_population) != len(population):
+            new_population = population.derive(*self.start)
+        else:
+            new_population.clear(*self.start)
+        new_population.copy_rows(slice(0, 2), population, order[:2])
+
+        children = np.arange(2, self.population_size)
+        parents = population.rng.choice(order[:20], (children.size, 2))
+        self.crossover(population, parents[:, 0], parents[:, 1], new_population, children)
+        self.mutate(new_population, children)
+
+        # Keep the best creature if it is one of the elites, otherwise keep a copy of it
+        if self.best_index is not None:
+            elite_rank = np.flatnonzero(order[:2] == self.best_index)
+            if elite_rank.size:
+                self.best_index = int(elite_rank[0])
+            else:
+                self.best_snapshot = population[self.best_index]
+                self.best_index = None
+
+        # Free the Q-Table rows only the previous generation was using
+        new_population.q.compact()
+        self.spare_population = population
+        self.population = new_population
         self.generation += 1
         # Reset for the new generation
         self.creatures_reached_goal = 0  
 
-    # Make a child for the parents chosen in the evolve function
-    def crossover(self, parent1, parent2):
-        child = Creature(WIDTH // 2, HEIGHT - 50)
-        mask = np.random.rand(MAX_STEPS * 2) < 0.5
-        child.genes = np.where(mask, parent1.genes, parent2.genes)
-        # Inherit Q-tables from parents
-        child.q_table = {**parent1.q_table, **parent2.q_table}
-        return child
+    # Copy of the count fittest creatures of the generation, sent to other islands (see islands.py)
+    def emigrants(self, count):
+        self.evaluate_fitness()
+        population = self.population
+        return population.subset(np.argsort(-population.fitness, kind='stable')[:count])
+
+    # Replace the least fit creatures of the finished generation by migrants from other islands (a Population)
+    # so they take part in the selection of the next evolve (the best creature is never replaced)
+    def immigrate(self, migrants):
+        self.evaluate_fitness()
+        population = self.population
+        order = np.argsort(population.fitness, kind='stable')
+        order = order[order != self.best_index][:len(migrants)]
+        population.copy_rows(order, migrants, slice(0, order.size))
+        self.finished_population = None
+
+        arrived = int(np.argmax(population.fitness[order])) if order.size else None
+        if arrived is not None and population.fitness[order[arrived]] > self.best_fitness:
+            self.best_fitness = float(population.fitness[order[arrived]])
+            self.best_index = int(order[arrived])
+
+    # Make children (rows of new_population) for the parents chosen in the evolve function
+    def crossover(self, population, parent1, parent2, new_population, children):
+        mask = population.rng.random((len(children), population.genes.shape[1])) < 0.5
+        new_population.genes[children] = np.where(mask, population.genes[parent1], population.genes[parent2])
+        # Inherit Q-tables from parents (states known by parent2 take precedence)
+        new_population.q.inherit(children, population.q, parent1, parent2)
     
-    # Random Mutation for each children
-    def mutate(self, creature):
-        mask = np.random.rand(MAX_STEPS * 2) < MUTATION_RATE
-        creature.genes[mask] = np.random.uniform(-1, 1, mask.sum())
+    # Random Mutation for each children (Gaussian noise on the Q-values of known states)
+    def mutate(self, population, creatures):
+        rng = population.rng
+        genes = population.genes[creatures]
+        mask = rng.random(genes.shape) < self.config.mutation_rate
+        genes[mask] = rng.uniform(-1, 1, mask.sum())
+        population.genes[creatures] = genes
         # Mutate Q-table
-        for state in creature.q_table:
-            for action in creature.q_table[state]:
-                if random.random() < MUTATION_RATE:
-                    creature.q_table[state][action] += np.random.normal(0, 0.1)
+        population.q.mutate(creatures, self.config.mutation_rate, 0.1, rng)
 
     # Reset every creature in the population scores
     def reset_population(self):
-        self.visited_cells.clear()
-        for creature in self.population:
-            creature.x = WIDTH // 2
-            creature.y = HEIGHT - 50
-            creature.initial_x = creature.x
-            creature.initial_y = creature.y
-            creature.steps = 0
-            creature.path.clear()
-            creature.is_dead = False
-            creature.reached_goal = False
-            creature.last_state = None
-            creature.last_action = None
-            creature.closest_distance_to_goal = float('inf')
-            creature.visited_positions.clear()
-            creature.epsilon = START_EPSILON
+        with self.profiler.phase('reset'):
+            self.frame = 0
+            self.fitness_frame = 0
+            self.visited_cells[:] = False
+            self.population.reset(*self.start)
+            if self.experience is not None and self.config.experience_seeding:
+                self.population.q.seed(self.experience.q_table, self.experience.q_known)
+            self.finished_count = 0
+            self.finished_population = self.population
+            if self.replay_dir is not None:
+                self.generation_rng_state = self.population.rng.bit_generator.state
+
+    # Save the action log of every generation (from the current one on) to directory, see action_log.py and replay.py
+    # The current generation must not have started yet for its log to be complete
+    def record_replays(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.replay_dir = directory
+        self.generation_rng_state = self.population.rng.bit_generator.state
 
     # Save the best creature in pickle file
     def save_best_creature(self, filename):
+        self.evaluate_fitness()
         if self.best_creature:
             with open(filename, 'wb') as f:
                 pickle.dump(self.best_creature, f)
@@ -228,8 +455,58 @@ class ObstacleCourse:
             with open(filename, 'rb') as f:
                 loaded_creature = pickle.load(f)
             self.population[0] = loaded_creature
-            self.best_creature = loaded_creature
+            self.finished_population = None
+            self.best_index = 0
             self.best_fitness = loaded_creature.fitness
             print(f"Best creature loaded from {filename}")
         else:
-            print(f"File {filename} not found")
\ No newline at end of file
+            print(f"File {filename} not found")
+
+    # Save the whole training state (population, Q-Tables, generation, random generator) to a .npz checkpoint
+    # With background=True only the snapshot is taken here, the file is written by a CheckpointWriter thread
+    def save_checkpoint(self, filename, compress=True, background=False):
+        self.evaluate_fitness()
+        if background:
+            if self.checkpoint_writer is None:
+                self.checkpoint_writer = CheckpointWriter()
+            self.checkpoint_writer.save(filename, snapshot(self), compress)
+            return
+        write_checkpoint(filename, snapshot(self), compress)
+        print(f"Checkpoint saved to {filename} ({os.path.getsize(filename) / 2 ** 20:.1f} MB)")
+
+    # Resume training from a checkpoint (a .pkl file of a single creature is loaded with load_best_creature)
+    def load_checkpoint(self, filename):
+        if filename.endswith('.pkl'):
+            self.load_best_creature(filename)
+        elif os.path.exists(filename):
+            restore(self, filename)
+            print(f"Checkpoint loaded from {filename} (generation {self.generation})")
+        else:
+            print(f"File {filename} not found")
+
+
+# Course used by each worker process of the pool to simulate its shards
+_worker_course = None
+
+
+# Set up a worker process with the layout, (already computed) grid and parameters of the course
+def _init_worker(layout, grid, profile, config):
+    global _worker_course
+    _worker_course = ObstacleCourse(population_size=0, workers=1, profile=profile, layout=layout, grid=grid,
+                                    config=config.replace(experience_batch=0))
+
+
+# Simulate a whole generation for one shard of the population (its transitions are sent back for the experience replay)
+def _simulate_shard(population):
+    course = _worker_course
+    course.population = population
+    course.frame = 0
+    course.fitness_frame = 0
+    course.visited_cells[:] = False
+    course.creatures_reached_goal = 0
+    course.best_index = None
+    course.best_fitness = float('-inf')
+    frames = course.run_generation()
+    transitions = course.experience.take() if course.experience is not None else None
+    return (population, course.visited_cells, course.creatures_reached_goal, course.best_index, course.best_fitness, frames,
+            course.profiler.take(), transitions)
@@ -0,0 +1,192 @@
+import numpy as np
+from config import *
+from geometry import any_clipline_hits, any_rect_overlaps, count_obstacles_crossed
+
+
+# Check moves from (old_x, old_y) to (new_x, new_y) against occupancy tables (shared by CourseGrid and GridStack)
+# blocked(x, y) and solid(x, y) look the tables up, clip_hits(rows) clips the diagonal moves of the given rows
+def _check_moves(blocked, solid, clip_hits, old_x, old_y, new_x, new_y):
+    hits = blocked(new_x, new_y)
+
+    # Horizontal and vertical moves check every pixel they go through
+    straight = (old_x == new_x) | (old_y == new_y)
+    length = int(np.max(np.abs(new_x - old_x) + np.abs(new_y - old_y), initial=0))
+    for t in range(length + 1):
+        px = old_x + np.clip(new_x - old_x, -t, t)
+        py = old_y + np.clip(new_y - old_y, -t, t)
+        hits = hits | (straight & solid(px, py))
+
+    # Any other move falls back to clipping the line against every obstacle
+    if not np.all(straight):
+        diagonal = np.flatnonzero(~straight)
+        hits = np.array(hits)
+        hits.flat[diagonal] |= clip_hits(diagonal)
+    return hits
+
+
+# Length of the shortest path from every pixel to source moving along the axes one pixel at a time through passable
+# pixels (breadth-first search, one vectorized step per pixel of distance), unreachable pixels get -1
+def _path_distances(passable, source):
+    # A border of impassable pixels keeps the neighbours of every pixel inside the array
+    padded = np.pad(passable, 1)
+    rows = padded.shape[1]
+    offsets = np.array([1, -1, rows, -rows])
+    distance = np.full(padded.size, -1, dtype=np.int32)
+    frontier = np.array([(source[0] + 1) * rows + source[1] + 1])
+    distance[frontier] = 0
+    step = 0
+    while frontier.size:
+        step += 1
+        neighbours = np.unique((frontier[:, None] + offsets).ravel())
+        frontier = neighbours[padded.flat[neighbours] & (distance[neighbours] < 0)]
+        distance[frontier] = step
+    return distance.reshape(padded.shape)[1:-1, 1:-1]
+
+
+# Class that precomputes per-pixel lookup tables for a static obstacle layout
+# Tables are indexed [x, y] for every pixel of the field (0..WIDTH, 0..HEIGHT)
+class CourseGrid:
+
+    # Rasterize the obstacles (the goal dependent tables are computed on first use)
+    def __init__(self, obstacles, goal):
+        self.obstacles = np.array(obstacles, dtype=np.int64).reshape(-1, 4)
+        self.goal = tuple(goal)
+        x, y = np.meshgrid(np.arange(WIDTH + 1), np.arange(HEIGHT + 1), indexing='ij')
+
+        # Pixels where a creature (square of CREATURE_SIZE around its center) overlaps an obstacle
+        self.blocked = any_rect_overlaps(self.obstacles, x, y, CREATURE_SIZE)
+
+        # Pixels covered by an obstacle (what pygame.Rect.clipline considers inside)
+        self.solid = np.zeros_like(self.blocked)
+        for ox, oy, ow, oh in self.obstacles:
+            self.solid[max(ox, 0):max(ox + ow, 0), max(oy, 0):max(oy + oh, 0)] = True
+
+        self._visible = None
+        self._obstacle_count = None
+        self._goal_distance = None
+
+    # Pixels with a straight line to the goal that doesn't touch any obstacle
+    @property
+    def visible(self):
+        if self._visible is None:
+            x, y = np.meshgrid(np.arange(WIDTH + 1), np.arange(HEIGHT + 1), indexing='ij')
+            self._visible = ~any_clipline_hits(self.obstacles, x, y, self.goal[0], self.goal[1])
+        return self._visible
+
+    # Number of obstacles crossed by the straight line from each pixel to the goal
+    @property
+    def obstacle_count(self):
+        if self._obstacle_count is None:
+            x, y = np.meshgrid(np.arange(WIDTH + 1), np.arange(HEIGHT + 1), indexing='ij')
+            count = count_obstacles_crossed(self.obstacles, x, y, self.goal)
+            self._obstacle_count = count.astype(np.min_scalar_type(len(self.obstacles)))
+        return self._obstacle_count
+
+    # Length in pixels of the shortest path to the goal from each pixel, going around the obstacles the way creatures
+    # move (along the axes, only through pixels inside the field where they don't overlap an obstacle)
+    # Pixels the goal can't be reached from get the longest distance of the reachable ones
+    @property
+    def goal_distance(self):
+        if self._goal_distance is None:
+            passable = ~self.blocked
+            passable[:CREATURE_SIZE, :] = passable[WIDTH - CREATURE_SIZE + 1:, :] = False
+            passable[:, :CREATURE_SIZE] = passable[:, HEIGHT - CREATURE_SIZE + 1:] = False
+            distance = _path_distances(passable, self.goal)
+            distance[distance < 0] = distance.max()
+            self._goal_distance = distance
+        return self._goal_distance
+
+    # Build the tables that are otherwise computed on first use (e.g. before sending the grid to other processes)
+    def precompute(self):
+        self.visible
+        self.obstacle_count
+        self.goal_distance
+        return self
+
+    # Save every table to a .npz file (see layouts.load_grid)
+    def save(self, filename):
+        self.precompute()
+        with open(filename, 'wb') as f:
+            np.savez_compressed(f, obstacles=self.obstacles, goal=np.array(self.goal), blocked=self.blocked,
+                                solid=self.solid, visible=self.visible, obstacle_count=self.obstacle_count,
+                                goal_distance=self.goal_distance)
+
+    # Load a grid saved by save()
+    @staticmethod
+    def load(filename):
+        grid = CourseGrid.__new__(CourseGrid)
+        with np.load(filename) as data:
+            grid.obstacles = data['obstacles']
+            grid.goal = tuple(int(v) for v in data['goal'])
+            grid.blocked = data['blocked']
+            grid.solid = data['solid']
+            grid._visible = data['visible']
+            grid._obstacle_count = data['obstacle_count']
+            grid._goal_distance = data['goal_distance']
+        return grid
+
+    # Check if creatures moving from (old_x, old_y) to (new_x, new_y) hit an obstacle
+    # Works for single positions or whole arrays of creatures
+    def check_collision(self, old_x, old_y, new_x, new_y):
+        old_x, old_y, new_x, new_y = (np.asarray(v, dtype=np.int64) for v in np.broadcast_arrays(old_x, old_y, new_x, new_y))
+        return _check_moves(lambda x, y: self.blocked[x, y], lambda x, y: self.solid[x, y],
+                            lambda rows: any_clipline_hits(self.obstacles, old_x.flat[rows], old_y.flat[rows],
+                                                           new_x.flat[rows], new_y.flat[rows]),
+                            old_x, old_y, new_x, new_y)
+
+    # Check if there's a direct path between the given positions and the goal
+    def check_direct_path(self, x, y):
+        return self.visible[x, y]
+
+    # Count obstacles between the given positions and the goal
+    def count_obstacles_between(self, x, y):
+        return self.obstacle_count[x, y]
+
+    # Length of the shortest path between the given positions and the goal
+    def distance_to_goal(self, x, y):
+        return self.goal_distance[x, y]
+
+
+# Tables of several layouts stacked along a first axis, every lookup also takes the layout of each position
+class GridStack:
+
+    def __init__(self, grids):
+        self.grids = grids
+        self.goals = np.array([grid.goal for grid in grids], dtype=np.int64).reshape(-1, 2)
+        self.blocked = np.stack([grid.blocked for grid in grids])
+        self.solid = np.stack([grid.solid for grid in grids])
+        self.visible = np.stack([grid.visible for grid in grids])
+        self.obstacle_count = np.stack([grid.obstacle_count for grid in grids])
+        self.goal_distance = np.stack([grid.goal_distance for grid in grids])
+
+    def __len__(self):
+        return len(self.grids)
+
+    # Check if creatures playing the given layouts hit an obstacle moving from (old_x, old_y) to (new_x, new_y)
+    def check_collision(self, layout, old_x, old_y, new_x, new_y):
+        layout, old_x, old_y, new_x, new_y = (np.asarray(v, dtype=np.int64)
+                                              for v in np.broadcast_arrays(layout, old_x, old_y, new_x, new_y))
+
+        # Diagonal moves are clipped against the obstacles of their own layout
+        def clip_hits(rows):
+            hits = np.zeros(rows.size, dtype=bool)
+            for k in np.unique(layout.flat[rows]):
+                mine = layout.flat[rows] == k
+                r = rows[mine]
+                hits[mine] = any_clipline_hits(self.grids[k].obstacles, old_x.flat[r], old_y.flat[r],
+                                               new_x.flat[r], new_y.flat[r])
+            return hits
+        return _check_moves(lambda x, y: self.blocked[layout, x, y], lambda x, y: self.solid[layout, x, y],
+                            clip_hits, old_x, old_y, new_x, new_y)
+
+    # Check if there's a direct path between the given positions and the goal of their layout
+    def check_direct_path(self, layout, x, y):
+        return self.visible[layout, x, y]
+
+    # Count obstacles between the given positions and the goal of their layout
+    def count_obstacles_between(self, layout, x, y):
+        return self.obstacle_count[layout, x, y]
+
+    # Length of the shortest path between the given positions and the goal of their layout
+    def distance_to_goal(self, layout, x, y):
+        return self.goal_distance[layout, x, y]
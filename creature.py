@@ -4,43 +4,149 @@ from config import *
 from obstacle_config import *
 import math
 
+# Moves a creature can take and the size of each step
+ACTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+STEP_SIZE = 5
+
+# Q-Table states are 50x50 cells of the field (see Creature.get_state)
+CELL_SIZE = 50
+STATE_SHAPE = (-(-WIDTH // CELL_SIZE), -(-HEIGHT // CELL_SIZE))
+
+# Creatures only ever stand on a lattice of STEP_SIZE pixels around their start, visited positions are one bit
+# per lattice position: a bitmap of LATTICE_BYTES bytes per lattice column (the same layout for every creature)
+LATTICE_SHAPE = (WIDTH // STEP_SIZE + 2, HEIGHT // STEP_SIZE + 2)
+LATTICE_BYTES = -(-LATTICE_SHAPE[1] // 8)
+# Bit of each lattice row inside its byte
+BITS = (1 << np.arange(8)).astype(np.uint8)
+
+# Number of past positions used for the stagnation penalty
+HISTORY_LENGTH = 10
+
+
+
+# Unpack visited bitmaps to booleans indexed [..., lx, ly]
+def unpack_bitmap(bitmap):
+    return np.unpackbits(bitmap, axis=-1, bitorder='little')[..., :LATTICE_SHAPE[1]].astype(bool)
+
 
 # Class that represents each instance in the generation
 class Creature:
 
-    # Initialize Creature
-    def __init__(self, x, y):
+    # Initialize Creature (with the parameters of config, Config() by default)
+    def __init__(self, x, y, config=None):
+        self.config = config or Config()
         self.x = x
         self.y = y
         self.initial_x = x
         self.initial_y = y
-        self.genes = np.random.uniform(-1, 1, MAX_STEPS * 2)
+        self.genes = np.random.uniform(-1, 1, self.config.max_steps * 2)
         self.fitness = 0
         self.steps = 0
-        self.path = set()
+        self.path_length = 0
         self.is_dead = False
-        self.q_table = {}
+        # Q-Table indexed [cx, cy, action], q_known marks the states the creature has seen
+        self.q_table = np.zeros((*STATE_SHAPE, len(ACTIONS)))
+        self.q_known = np.zeros(STATE_SHAPE, dtype=bool)
         self.last_state = None
         self.last_action = None
         self.closest_distance_to_goal = float('inf')
         self.reached_goal = False
-        self.previous_positions = []
-        self.visited_positions = set()
+        # Last positions in a ring buffer, history_head is the next slot written
+        self.previous_positions = np.zeros((HISTORY_LENGTH, 2), dtype=np.int64)
+        self.history_head = 0
+        self.history_length = 0
+        # Positions traversed in this generation (bitmap over the lattice, see LATTICE_SHAPE)
+        self.origin = (int(x) % STEP_SIZE, int(y) % STEP_SIZE)
+        self.visited = np.zeros((LATTICE_SHAPE[0], LATTICE_BYTES), dtype=np.uint8)
         self.direct_path_to_goal = False
-        self.actions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-        self.epsilon = START_EPSILON
+        self.actions = list(ACTIONS)
+        self.epsilon = self.config.start_epsilon
+        # Actions taken in this generation, 2 bits each (the index in ACTIONS), 4 per byte, used to replay it
+        # A creature takes at most max_steps actions (any action that doesn't move it ends its generation)
+        self.action_log = np.zeros(self.config.action_log_bytes, dtype=np.uint8)
+        self.action_count = 0
+
+    # Load pickled creatures, older files stored the Q-Table as a dict of dicts
+    # and the path, visited positions and previous positions as sets and lists of tuples
+    def __setstate__(self, state):
+        q_table = state.get('q_table', {})
+        if isinstance(q_table, dict):
+            state['q_table'] = np.zeros((*STATE_SHAPE, len(ACTIONS)))
+            state['q_known'] = np.zeros(STATE_SHAPE, dtype=bool)
+            for (cx, cy), actions in q_table.items():
+                state['q_known'][cx, cy] = True
+                for action, q in actions.items():
+                    state['q_table'][cx, cy, ACTIONS.index(action)] = q
+        path = state.pop('path', None)
+        visited_positions = state.pop('visited_positions', None)
+        state.setdefault('config', Config())
+        state.setdefault('action_log', np.zeros(state['config'].action_log_bytes, dtype=np.uint8))
+        state.setdefault('action_count', 0)
+        self.__dict__.update(state)
+
+        if path is not None:
+            self.origin = (int(self.initial_x) % STEP_SIZE, int(self.initial_y) % STEP_SIZE)
+            self.visited = np.zeros((LATTICE_SHAPE[0], LATTICE_BYTES), dtype=np.uint8)
+            for px, py in path | (visited_positions or set()):
+                self.visit(px, py)
+            self.path_length = len(path)
+        if isinstance(self.previous_positions, list):
+            history = self.previous_positions[-HISTORY_LENGTH:]
+            self.previous_positions = np.zeros((HISTORY_LENGTH, 2), dtype=np.int64)
+            self.previous_positions[:len(history)] = np.reshape(history, (-1, 2))
+            self.history_length = len(history)
+            self.history_head = len(history) % HISTORY_LENGTH
+
+    # Lattice position (indexes of the visited bitmap) of a pixel position
+    def lattice_index(self, x, y):
+        return (int(x) - self.origin[0]) // STEP_SIZE, (int(y) - self.origin[1]) // STEP_SIZE
+
+    # Check if the creature already traversed (x, y) in this generation
+    def has_visited(self, x, y):
+        lx, ly = self.lattice_index(x, y)
+        return bool(self.visited[lx, ly >> 3] & BITS[ly & 7])
+
+    # Mark (x, y) as traversed
+    def visit(self, x, y):
+        lx, ly = self.lattice_index(x, y)
+        self.visited[lx, ly >> 3] |= BITS[ly & 7]
+
+    # Get the positions the creature traversed in this generation
+    def get_path(self):
+        lx, ly = np.nonzero(unpack_bitmap(self.visited))
+        return {(int(px) * STEP_SIZE + self.origin[0], int(py) * STEP_SIZE + self.origin[1]) for px, py in zip(lx, ly)}
+
+    # Add a position to the ring buffer of previous positions (the oldest one is overwritten when full)
+    def remember_position(self, x, y):
+        self.previous_positions[self.history_head] = (x, y)
+        self.history_head = (self.history_head + 1) % HISTORY_LENGTH
+        self.history_length = min(self.history_length + 1, HISTORY_LENGTH)
+
+    # Get the previous positions, oldest first
+    def get_previous_positions(self):
+        slots = (self.history_head - self.history_length + np.arange(self.history_length)) % HISTORY_LENGTH
+        return [(int(px), int(py)) for px, py in self.previous_positions[slots]]
+
+    # Append an action (index in ACTIONS) to the action log
+    def log_action(self, action):
+        t = self.action_count
+        self.action_log[t >> 2] |= action << 2 * (t & 3)
+        self.action_count += 1
+
+    # Get the logged actions of this generation (indexes in ACTIONS)
+    def get_logged_actions(self):
+        t = np.arange(self.action_count)
+        return ((self.action_log[t >> 2] >> 2 * (t & 3)) & 3).tolist()
 
     def get_state(self):
-        return (int(self.x // 50), int(self.y // 50))
+        return (int(self.x // CELL_SIZE), int(self.y // CELL_SIZE))
     
     # Get a move that didn't result to a path the creature already traversed in that generation
     def get_valid_random_action(self):
         valid_actions = self.actions.copy()
         random.shuffle(valid_actions)
         for action in valid_actions:
-            new_x = int(self.x + action[0] * 5)
-            new_y = int(self.y + action[1] * 5)
-            if (new_x, new_y) not in self.visited_positions:
+            if not self.has_visited(self.x + action[0] * STEP_SIZE, self.y + action[1] * STEP_SIZE):
                 return action
         
         # Return None if there're no valid moves
@@ -48,11 +154,9 @@ class Creature:
 
     # Get the best possible move a creature can traverse
     def get_best_valid_action(self, state):
-        actions = sorted(self.q_table[state].items(), key=lambda x: x[1], reverse=True)
-        for action, _ in actions:
-            new_x = int(self.x + action[0] * 5)
-            new_y = int(self.y + action[1] * 5)
-            if (new_x, new_y) not in self.visited_positions:
+        for action in np.argsort(-self.q_table[state], kind='stable'):
+            action = self.actions[action]
+            if not self.has_visited(self.x + action[0] * STEP_SIZE, self.y + action[1] * STEP_SIZE):
                 return action
         
         # Return None if there're no valid moves
@@ -64,13 +168,12 @@ class Creature:
         #     return self.move_towards_goal()
 
         # Reduce Epsilon as each steps taken
-        self.epsilon = self.epsilon * DECAY
+        self.epsilon = self.epsilon * self.config.decay
 
         # Limit Minimum Learning Rate. Get either a random move or best possible move (based on Reinforcement Learning)
-        if random.random() < max(MIN_EPSILON, self.epsilon):
+        if random.random() < max(self.config.min_epsilon, self.epsilon):
             return self.get_valid_random_action()
-        if state not in self.q_table:
-            self.q_table[state] = {action: 0 for action in self.actions}
+        self.q_known[state] = True
         return self.get_best_valid_action(state)
         
     
@@ -88,14 +191,14 @@ class Creature:
         new_y = self.y + (dy / distance) * move_distance
         
         # Check if the new position has been visited
-        if (int(new_x), int(new_y)) in self.visited_positions:
+        if self.has_visited(new_x, new_y):
             return self.get_valid_random_action()
         
         return (new_x - self.x, new_y - self.y)
     
     # Orchestrator that checked the state of creature and calculate their actions accordingly
     def move(self):
-        if not self.is_dead and not self.reached_goal and self.steps < MAX_STEPS:
+        if not self.is_dead and not self.reached_goal and self.steps < self.config.max_steps:
             state = self.get_state()
             
             # if self.direct_path_to_goal:
@@ -110,6 +213,7 @@ class Creature:
                 if action is None:
                     self.is_dead = True
                     return
+                self.log_action(self.actions.index(action))
                 dx, dy = action[0] * 5, action[1] * 5
             
             new_x = self.x + dx
@@ -120,16 +224,14 @@ class Creature:
                 self.is_dead = True
             else:
                 self.x, self.y = new_x, new_y
-                self.path.add((int(self.x), int(self.y)))
-                self.visited_positions.add((int(self.x), int(self.y)))
+                self.visit(self.x, self.y)
+                self.path_length += 1
                 self.steps += 1
             
             self.last_state = state
             self.last_action = action
             
-            self.previous_positions.append((self.x, self.y))
-            if len(self.previous_positions) > 10:
-                self.previous_positions.pop(0)
+            self.remember_position(self.x, self.y)
     
     def continuous_to_discrete_action(self, action):
         if isinstance(action, tuple) and len(action) == 2:
@@ -143,34 +245,32 @@ class Creature:
     # Update Q-Table for each creature after each moves (for Reinforcement Learning)
     def update_q_table(self, reward, new_state):
         if self.last_state is not None and self.last_action is not None:
-            if self.last_state not in self.q_table:
-                self.q_table[self.last_state] = {action: 0 for action in self.actions}
-            
             # Convert continuous action to discrete for Q-table update
-            discrete_action = self.continuous_to_discrete_action(self.last_action)
-            
+            discrete_action = self.actions.index(self.continuous_to_discrete_action(self.last_action))
+
+            self.q_known[self.last_state] = True
             old_q = self.q_table[self.last_state][discrete_action]
-            
-            if new_state not in self.q_table:
-                self.q_table[new_state] = {action: 0 for action in self.actions}
-            
-            max_future_q = max(self.q_table[new_state].values())
-            
-            new_q = (1 - LEARNING_RATE) * old_q + LEARNING_RATE * (reward + DISCOUNT_FACTOR * max_future_q)
+
+            self.q_known[new_state] = True
+            max_future_q = self.q_table[new_state].max()
+
+            learning_rate = self.config.learning_rate
+            new_q = (1 - learning_rate) * old_q + learning_rate * (reward + self.config.discount_factor * max_future_q)
             self.q_table[self.last_state][discrete_action] = new_q
     
     # Give penalty if creature stays in one place (currently a bit redundant since creature that can't take moves will die)
     def calculate_stagnation_penalty(self):
-        if len(self.previous_positions) < 2:
+        previous_positions = self.get_previous_positions()
+        if len(previous_positions) < 2:
             return 0
         
         total_distance = 0
-        for i in range(1, len(self.previous_positions)):
-            x1, y1 = self.previous_positions[i-1]
-            x2, y2 = self.previous_positions[i]
+        for i in range(1, len(previous_positions)):
+            x1, y1 = previous_positions[i-1]
+            x2, y2 = previous_positions[i]
             total_distance += math.hypot(x2 - x1, y2 - y1)
         
-        avg_distance = total_distance / (len(self.previous_positions) - 1)
+        avg_distance = total_distance / (len(previous_positions) - 1)
         
         # Penalize more if average movement is less than 1 pixel per step
         return max(0, 1 - avg_distance) * 0.5
@@ -190,7 +290,7 @@ class Creature:
         progress_score = (math.hypot(self.initial_x - goal[0], self.initial_y - goal[1]) - self.closest_distance_to_goal) / 100
 
         # Reward for exploring new areas
-        exploration_score = len(self.path) / (WIDTH * HEIGHT) * 10
+        exploration_score = self.path_length / (WIDTH * HEIGHT) * 10
 
         # Penalty for  the number of Obstacles between self and goal (if we pull a straight line)
         obstacle_penalty = obstacle_count * 0.1
@@ -202,7 +302,7 @@ class Creature:
         stagnation_penalty = self.calculate_stagnation_penalty()
 
         # Reward for surviving
-        survival_bonus = self.steps / MAX_STEPS
+        survival_bonus = self.steps / self.config.max_steps
 
         # Combine all components
         self.fitness = (
@@ -217,4 +317,4 @@ class Creature:
 
         # Massive Reward for reaching the goal
         if self.reached_goal:
-            self.fitness += GOAL_REWARD
\ No newline at end of file
+            self.fitness += self.config.goal_reward
\ No newline at end of file
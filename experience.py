@@ -0,0 +1,94 @@
+import numpy as np
+from config import *
+from creature import ACTIONS, STATE_SHAPE
+
+# Arrays holding each transition: state (Q-Table cell), action, reward, next state and whether it ended the creature
+TRANSITION_ARRAYS = ('cx', 'cy', 'action', 'reward', 'next_cx', 'next_cy', 'done')
+
+
+# Transitions of every creature of the population kept in a fixed-size ring buffer (the oldest are overwritten),
+# and a Q-Table shared by the population learnt from random batches of them
+# The shared table seeds the states creatures don't know yet when the population is reset (see ObstacleCourse)
+class ExperienceReplay:
+
+    def __init__(self, size, batch_size, learning_rate, discount_factor, rng=None):
+        self.size = size
+        self.batch_size = batch_size
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.cx = np.zeros(size, dtype=np.int16)
+        self.cy = np.zeros(size, dtype=np.int16)
+        self.action = np.zeros(size, dtype=np.int8)
+        self.reward = np.zeros(size)
+        self.next_cx = np.zeros(size, dtype=np.int16)
+        self.next_cy = np.zeros(size, dtype=np.int16)
+        self.done = np.zeros(size, dtype=bool)
+        # Number of transitions stored and slot the next one is written to
+        self.count = 0
+        self.head = 0
+        self.q_table = np.zeros((*STATE_SHAPE, len(ACTIONS)))
+        self.q_known = np.zeros(STATE_SHAPE, dtype=bool)
+
+    # Buffer for the parameters of a run (None when config doesn't use one)
+    @staticmethod
+    def from_config(config, rng=None):
+        if not config.experience_size:
+            return None
+        return ExperienceReplay(config.experience_size, config.experience_batch, config.learning_rate,
+                                config.discount_factor, rng)
+
+    def __len__(self):
+        return self.count
+
+    # Store transitions of many creatures at once (only the last size ones fit)
+    def add(self, cx, cy, action, reward, next_cx, next_cy, done):
+        n = min(len(cx), self.size)
+        slots = (self.head + np.arange(n)) % self.size
+        for name, values in zip(TRANSITION_ARRAYS, (cx, cy, action, reward, next_cx, next_cy, done)):
+            getattr(self, name)[slots] = values[len(values) - n:]
+        self.head = (self.head + n) % self.size
+        self.count = min(self.count + n, self.size)
+
+    # Stored transitions, oldest first
+    def arrays(self):
+        order = (self.head - self.count + np.arange(self.count)) % self.size
+        return {name: getattr(self, name)[order] for name in TRANSITION_ARRAYS}
+
+    # Stored transitions (see arrays), the buffer is emptied
+    def take(self):
+        arrays = self.arrays()
+        self.count = 0
+        self.head = 0
+        return arrays
+
+    # Update the shared Q-Table from steps random batches of transitions (a batch size of 0 never learns)
+    # Transitions of the same state and action in a batch are averaged into one update
+    def learn(self, steps=1):
+        if not self.batch_size or not self.count:
+            return
+        q = self.q_table.reshape(-1)
+        for _ in range(steps):
+            rows = self.rng.integers(self.count, size=self.batch_size)
+            cx, cy, action = self.cx[rows], self.cy[rows], self.action[rows]
+            future = np.where(self.done[rows], 0, self.q_table[self.next_cx[rows], self.next_cy[rows]].max(axis=1))
+            state = np.ravel_multi_index((cx, cy, action), self.q_table.shape)
+            error = self.reward[rows] + self.discount_factor * future - q[state]
+            total = np.bincount(state, error, minlength=q.size)
+            count = np.bincount(state, minlength=q.size)
+            q += self.learning_rate * total / np.maximum(count, 1)
+            self.q_known[cx, cy] = True
+
+    # Arrays holding the whole buffer and shared table (e.g. to save a checkpoint), see load_arrays
+    # The slots are kept as they are (not reordered) so a restored buffer draws the same batches
+    def to_arrays(self):
+        arrays = {name: getattr(self, name)[:self.count].copy() for name in TRANSITION_ARRAYS}
+        return {**arrays, 'head': np.array(self.head), 'q_table': self.q_table.copy(), 'q_known': self.q_known.copy()}
+
+    def load_arrays(self, arrays):
+        self.count = len(arrays['cx'])
+        self.head = int(arrays['head'])
+        for name in TRANSITION_ARRAYS:
+            getattr(self, name)[:self.count] = arrays[name]
+        self.q_table[:] = arrays['q_table']
+        self.q_known[:] = arrays['q_known']
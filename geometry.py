@@ -0,0 +1,110 @@
+import numpy as np
+
+
+# Vectorized geometry helpers used to test many creatures against the obstacles at once
+# Obstacles are given as an (n, 4) array of (x, y, width, height) like OBSTACLES in obstacle_config.py
+
+
+# Divide integers rounding toward zero (like C integer division)
+def _trunc_div(a, b):
+    q = np.abs(a) // np.abs(b)
+    return np.where((a < 0) ^ (b < 0), -q, q)
+
+
+# Cohen-Sutherland outcode of each point (matches SDL's ComputeOutCode)
+def _outcode(left, top, right, bottom, x, y):
+    code = np.where(y < top, 1, np.where(y > bottom, 2, 0))
+    code |= np.where(x < left, 4, np.where(x > right, 8, 0))
+    return code
+
+
+# Check if each segment touches a rectangle, same result as pygame.Rect.clipline(...) being non-empty
+def clipline_hits(rect, x1, y1, x2, y2):
+    left, top = rect[0], rect[1]
+    right, bottom = rect[0] + rect[2] - 1, rect[1] + rect[3] - 1
+    x1, y1, x2, y2 = (np.array(v, dtype=np.int64) for v in np.broadcast_arrays(x1, y1, x2, y2))
+    if rect[2] <= 0 or rect[3] <= 0:
+        return np.zeros(x1.shape, dtype=bool)
+
+    inside = ((x1 >= left) & (x1 <= right) & (x2 >= left) & (x2 <= right) &
+              (y1 >= top) & (y1 <= bottom) & (y2 >= top) & (y2 <= bottom))
+    outside = (((x1 < left) & (x2 < left)) | ((x1 > right) & (x2 > right)) |
+               ((y1 < top) & (y2 < top)) | ((y1 > bottom) & (y2 > bottom)))
+    undecided = ~inside & ~outside
+
+    # Horizontal and vertical lines that are not entirely on one side always clip
+    hits = np.array(inside | (undecided & ((y1 == y2) | (x1 == x2))))
+
+    # Diagonal lines go through the integer Cohen-Sutherland loop
+    rows = np.flatnonzero(undecided & (y1 != y2) & (x1 != x2))
+    x1, y1, x2, y2 = x1.flat[rows], y1.flat[rows], x2.flat[rows], y2.flat[rows]
+    code1 = _outcode(left, top, right, bottom, x1, y1)
+    code2 = _outcode(left, top, right, bottom, x2, y2)
+    while rows.size:
+        rejected = (code1 & code2) != 0
+        accepted = (code1 == 0) & (code2 == 0)
+        hits.flat[rows[accepted]] = True
+        keep = ~rejected & ~accepted
+        rows, x1, y1, x2, y2, code1, code2 = (v[keep] for v in (rows, x1, y1, x2, y2, code1, code2))
+
+        # Clip the first endpoint if it is outside, otherwise the second one
+        first = code1 != 0
+        code = np.where(first, code1, code2)
+        clip_y = (code & 3) != 0
+        edge_y = np.where(code & 1, top, bottom)
+        edge_x = np.where(code & 4, left, right)
+        dx, dy = x2 - x1, y2 - y1
+        new_x = np.where(clip_y, x1 + _trunc_div(dx * (edge_y - y1), np.where(clip_y, dy, 1)), edge_x)
+        new_y = np.where(clip_y, edge_y, y1 + _trunc_div(dy * (edge_x - x1), np.where(clip_y, 1, dx)))
+        x1, y1 = np.where(first, new_x, x1), np.where(first, new_y, y1)
+        x2, y2 = np.where(first, x2, new_x), np.where(first, y2, new_y)
+        code1 = np.where(first, _outcode(left, top, right, bottom, x1, y1), code1)
+        code2 = np.where(first, code2, _outcode(left, top, right, bottom, x2, y2))
+    return hits
+
+
+# Check if segments touch any of the obstacles
+def any_clipline_hits(obstacles, x1, y1, x2, y2):
+    hits = np.zeros(np.broadcast(x1, y1, x2, y2).shape, dtype=bool)
+    for rect in obstacles:
+        hits |= clipline_hits(rect, x1, y1, x2, y2)
+    return hits
+
+
+# Check if square creatures centered on (x, y) overlap any obstacle (same as pygame.Rect.colliderect)
+def any_rect_overlaps(obstacles, x, y, size):
+    x, y = np.broadcast_arrays(x, y)
+    hits = np.zeros(x.shape, dtype=bool)
+    for ox, oy, ow, oh in obstacles:
+        if ow <= 0 or oh <= 0:
+            continue
+        hits |= (x - size < ox + ow) & (y - size < oy + oh) & (x + size > ox) & (y + size > oy)
+    return hits
+
+
+# Check if segments (x1, y1)-(x2, y2) intersect the segment (x3, y3)-(x4, y4)
+def _segments_intersect(x1, y1, x2, y2, x3, y3, x4, y4):
+    den = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
+    safe_den = np.where(den == 0, 1, den)
+    t = ((x1 - x3) * (y3 - y4) - (y1 - y3) * (x3 - x4)) / safe_den
+    u = -((x1 - x2) * (y1 - y3) - (y1 - y2) * (x1 - x3)) / safe_den
+    return (den != 0) & (0 <= t) & (t <= 1) & (0 <= u) & (u <= 1)
+
+
+# Count obstacles crossed by the straight line between each point and the goal
+def count_obstacles_crossed(obstacles, x, y, goal):
+    x, y = (np.asarray(v, dtype=np.int64) for v in np.broadcast_arrays(x, y))
+    count = np.zeros(x.shape, dtype=np.int64)
+    for ox, oy, ow, oh in obstacles:
+        left, top, right, bottom = ox, oy, ox + ow, oy + oh
+        edges = [
+            (left, top, right, top),
+            (right, top, right, bottom),
+            (right, bottom, left, bottom),
+            (left, bottom, left, top),
+        ]
+        crossed = np.zeros(x.shape, dtype=bool)
+        for edge in edges:
+            crossed |= _segments_intersect(x, y, goal[0], goal[1], *edge)
+        count += crossed
+    return count
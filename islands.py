@@ -0,0 +1,158 @@
+import argparse
+import multiprocessing
+import pickle
+import queue
+import time
+from config import *
+from course import ObstacleCourse
+from layouts import default_layout, load_grid, load_layouts
+
+# Ways islands are connected: each island sends migrants to the next one ('ring'), to both neighbours on the ring
+# ('bidirectional') or to every other island ('full')
+TOPOLOGIES = ('ring', 'bidirectional', 'full')
+
+
+# Islands island i sends its migrants to
+def neighbours(i, islands, topology):
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {topology!r}, expected one of {', '.join(TOPOLOGIES)}")
+    if islands == 1:
+        return []
+    if topology == 'ring':
+        return [(i + 1) % islands]
+    if topology == 'bidirectional':
+        return sorted({(i - 1) % islands, (i + 1) % islands})
+    return [j for j in range(islands) if j != i]
+
+
+# Run one island in its own process: evolve its own population and every interval generations send a copy of its
+# fittest creatures to its neighbours, then replace its least fit creatures by the migrants it receives
+# Migrants are merged in the order of the islands they come from so runs are reproducible given the seed
+def _run_island(index, settings, inboxes, results):
+    islands = len(inboxes)
+    seed = None if settings['seed'] is None else settings['seed'] + index
+    course = ObstacleCourse(settings['population_size'], workers=1, seed=seed, q_store=settings['q_store'],
+                            layout=settings['layout'], grid=settings['grid'], config=settings['config'])
+    targets = neighbours(index, islands, settings['topology'])
+    sources = [j for j in range(islands) if index in neighbours(j, islands, settings['topology'])]
+    count = max(1, round(settings['rate'] * settings['population_size']))
+    # Migrants that arrived early (from islands already at a later migration)
+    arrived = {}
+
+    for _ in range(settings['generations']):
+        start = time.perf_counter()
+        frames = course.run_generation()
+        steps = int(course.population.steps.sum())
+        generation = course.generation
+
+        if settings['interval'] and (generation + 1) % settings['interval'] == 0 and targets:
+            migrants = course.emigrants(count)
+            for j in targets:
+                inboxes[j].put((generation, index, migrants))
+            while sum(key[0] == generation for key in arrived) < len(sources):
+                migration, source, population = inboxes[index].get()
+                arrived[migration, source] = population
+            for source in sources:
+                course.immigrate(arrived.pop((generation, source)))
+
+        results.put(('generation', index, generation, course.best_fitness, course.creatures_reached_goal, frames, steps,
+                     time.perf_counter() - start))
+        course.evolve()
+        course.reset_population()
+
+    course.evaluate_fitness()
+    results.put(('done', index, course.best_fitness, course.best_creature))
+    course.close()
+
+
+# Evolve one population per island in parallel processes, migrating every interval generations
+# Prints each generation once every island finished it and returns the best creature of all islands
+def run_islands(islands, generations, population_size=None, interval=MIGRATION_INTERVAL,
+                rate=MIGRATION_RATE, topology=MIGRATION_TOPOLOGY, seed=SEED, q_store=Q_STORE, layout=None, config=None):
+    neighbours(0, islands, topology)
+    config = config or Config()
+    population_size = population_size or config.population_size
+    # The grid is loaded once here and handed to every island
+    layout = layout or default_layout()
+    settings = {'generations': generations, 'population_size': population_size, 'interval': interval, 'rate': rate,
+                'topology': topology, 'seed': seed, 'q_store': q_store, 'layout': layout, 'grid': load_grid(layout),
+                'config': config}
+    inboxes = [multiprocessing.Queue() for _ in range(islands)]
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_run_island, args=(i, settings, inboxes, results), daemon=True)
+                 for i in range(islands)]
+    for process in processes:
+        process.start()
+
+    start = time.perf_counter()
+    reports = {}
+    best = {}
+    total_steps = 0
+    while len(best) < islands:
+        try:
+            message = results.get(timeout=1)
+        except queue.Empty:
+            # An island that died without finishing would leave the others waiting for its migrants
+            failed = [i for i, process in enumerate(processes) if process.exitcode not in (None, 0) and i not in best]
+            if failed:
+                for process in processes:
+                    process.terminate()
+                raise RuntimeError(f"Island {failed[0]} failed with exit code {processes[failed[0]].exitcode}")
+            continue
+
+        if message[0] == 'done':
+            best[message[1]] = message[2:]
+            continue
+        index, generation, best_fitness, reached_goal, frames, steps, elapsed = message[1:]
+        total_steps += steps
+        reports.setdefault(generation, {})[index] = (best_fitness, reached_goal, frames, steps, elapsed)
+        if len(reports[generation]) == islands:
+            report = reports.pop(generation)
+            report = [report[i] for i in range(islands)]
+            migrated = interval and (generation + 1) % interval == 0 and islands > 1
+            print(f"Generation {generation}: best fitness {max(r[0] for r in report):.4f} "
+                  f"({', '.join(f'{r[0]:.2f}' for r in report)}), "
+                  f"reached goal {sum(r[1] for r in report)}/{islands * population_size}, "
+                  f"{sum(r[3] for r in report)} steps{', migrated' if migrated else ''}")
+
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    print(f"{islands} islands x {generations} generations in {elapsed:.2f}s: "
+          f"{islands * generations / elapsed:.3f} island generations/sec, {total_steps / elapsed:.0f} steps/sec")
+
+    island = max(best, key=lambda i: best[i][0])
+    print(f"Best creature from island {island} (fitness {best[island][0]:.4f})")
+    return best[island][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Island model: populations evolving in parallel processes "
+                                                 "that exchange their fittest creatures")
+    parser.add_argument("--islands", type=int, default=ISLANDS, help="number of islands (one process each)")
+    parser.add_argument("--generations", type=int, default=10, help="number of generations to run")
+    parser.add_argument("--population-size", type=int, help="population of each island (POPULATION_SIZE by default)")
+    parser.add_argument("--interval", type=int, default=MIGRATION_INTERVAL,
+                        help="migrate every N generations (0 never migrates)")
+    parser.add_argument("--rate", type=float, default=MIGRATION_RATE,
+                        help="fraction of an island's population sent to each neighbour")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default=MIGRATION_TOPOLOGY, help="islands migrants go to")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed for reproducible runs (island i uses seed + i)")
+    parser.add_argument("--q-store", choices=["dense", "cow"], default=Q_STORE, help="Q-Table store")
+    parser.add_argument("--layout", help="evolve on the first layout of this .json file instead of obstacle_config.py")
+    parser.add_argument("--set", nargs="*", default=[], metavar="NAME=VALUE",
+                        help="change parameters of config.py for this run (e.g. mutation_rate=0.2)")
+    parser.add_argument("--save", help="save the best creature of all islands to this file")
+    args = parser.parse_args()
+
+    layout = load_layouts(args.layout)[0] if args.layout else None
+    best_creature = run_islands(args.islands, args.generations, args.population_size, args.interval, args.rate,
+                                args.topology, args.seed, args.q_store, layout, Config.parse(args.set))
+    if args.save and best_creature:
+        with open(args.save, 'wb') as f:
+            pickle.dump(best_creature, f)
+        print(f"Best creature saved to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
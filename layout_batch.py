@@ -0,0 +1,132 @@
+import argparse
+import json
+import time
+import numpy as np
+from config import *
+from course import ObstacleCourse
+from course_grid import GridStack
+from creature import STEP_SIZE
+from layouts import generate_layouts, load_layouts, load_grid
+from population import STATE_SHAPE
+
+
+# Course evaluating creatures on many layouts in one batched run: the creatures are replicated once per layout
+# (rows [k * n, (k + 1) * n) play layout k) and every frame steps all of them together, their positions are looked
+# up in the grids of the layouts stacked by GridStack (each grid comes from the layout cache)
+class LayoutBatch(ObstacleCourse):
+
+    def __init__(self, layouts, cache_dir=LAYOUT_CACHE_DIR, profile=PROFILE, config=None):
+        # Visited positions are bitmaps over one lattice, so every start must be on it
+        if len({(x % STEP_SIZE, y % STEP_SIZE) for x, y in (layout.start for layout in layouts)}) > 1:
+            raise ValueError(f"Layouts evaluated together must start on the same lattice of {STEP_SIZE} pixels")
+        grids = [load_grid(layout, cache_dir) for layout in layouts]
+        super().__init__(population_size=0, workers=1, profile=profile, layout=layouts[0], grid=grids[0], config=config)
+        self.layouts = layouts
+        self.grids = GridStack(grids)
+        self.starts = np.array([layout.start for layout in layouts], dtype=np.int64)
+        # Visited cells of each layout for the novelty score, and the layout played by each row
+        self.visited_cells = np.zeros((len(layouts), *STATE_SHAPE), dtype=bool)
+        self.layout_of = np.zeros(0, dtype=np.int64)
+
+    def goal_of(self, idx):
+        goals = self.grids.goals[self.layout_of[idx]]
+        return goals[:, 0], goals[:, 1]
+
+    def direct_path_of(self, idx, x, y):
+        return self.grids.check_direct_path(self.layout_of[idx], x, y)
+
+    def collision_of(self, idx, old_x, old_y, new_x, new_y):
+        return self.grids.check_collision(self.layout_of[idx], old_x, old_y, new_x, new_y)
+
+    def obstacle_count_of(self, idx, x, y):
+        return self.grids.count_obstacles_between(self.layout_of[idx], x, y)
+
+    def goal_distance_of(self, idx, x, y):
+        return self.grids.distance_to_goal(self.layout_of[idx], x, y)
+
+    def mark_visited_cells(self, idx, cx, cy):
+        self.visited_cells[self.layout_of[idx], cx, cy] = True
+
+    def visited_cell_count(self, idx):
+        return self.visited_cells.sum(axis=(1, 2))[self.layout_of[idx]]
+
+    # Play one generation of the given rows of population (all of them by default) on every layout
+    # The creatures play copies (their Q-Tables keep learning as in training), population is left untouched
+    # Return the fitness and whether the goal was reached, both indexed [layout, row]
+    def evaluate(self, population, rows=None, seed=None):
+        rows = np.arange(len(population)) if rows is None else np.asarray(rows)
+        batch = population.subset(np.tile(rows, len(self.layouts)), np.random.default_rng(seed))
+        self.layout_of = np.repeat(np.arange(len(self.layouts)), rows.size)
+        batch.reset(*self.start)
+        starts = self.starts[self.layout_of]
+        batch.x[:], batch.y[:] = starts[:, 0], starts[:, 1]
+        batch.initial_x[:], batch.initial_y[:] = starts[:, 0], starts[:, 1]
+
+        self.population = batch
+        self.population_size = len(batch)
+        self.frame = 0
+        self.fitness_frame = 0
+        self.visited_cells[:] = False
+        self.creatures_reached_goal = 0
+        self.best_index = None
+        self.best_fitness = float('-inf')
+        self.run_generation()
+        shape = (len(self.layouts), rows.size)
+        return batch.fitness.reshape(shape), batch.reached_goal.reshape(shape)
+
+
+# Evaluate the best creatures of a checkpoint (or a single .pkl creature) on many layouts and report
+# how well they generalize: the fitness on each layout and the mean over the layouts of each creature
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate creatures on many course layouts in one batched run")
+    parser.add_argument("--resume", default=CHECKPOINT_FILE,
+                        help="checkpoint (.npz) or best creature (.pkl) whose creatures are evaluated")
+    parser.add_argument("--top", type=int, default=20, help="number of creatures evaluated (the fittest ones)")
+    parser.add_argument("--layouts", nargs="*", default=[], help=".json layout files or directories of them")
+    parser.add_argument("--generate", type=int, default=0, help="also evaluate N random layouts")
+    parser.add_argument("--obstacles", type=int, default=40, help="number of obstacles of the random layouts")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random layouts and of the evaluation")
+    parser.add_argument("--cache-dir", default=LAYOUT_CACHE_DIR, help="directory caching the grid of each layout")
+    parser.add_argument("--output", help="save the results to this .json file")
+    args = parser.parse_args()
+
+    layouts = [layout for path in args.layouts for layout in load_layouts(path)]
+    layouts += generate_layouts(args.generate, args.obstacles, args.seed)
+    if not layouts:
+        parser.error("give --layouts or --generate")
+
+    course = ObstacleCourse(workers=1)
+    course.load_checkpoint(args.resume)
+    course.evaluate_fitness()
+    population = course.population
+    rows = np.argsort(-population.fitness, kind='stable')[:args.top]
+    if args.resume.endswith('.pkl'):
+        rows = np.array([0])
+
+    start = time.perf_counter()
+    batch = LayoutBatch(layouts, args.cache_dir, config=course.config)
+    grids_loaded = time.perf_counter()
+    fitness, reached_goal = batch.evaluate(population, rows, args.seed)
+    elapsed = time.perf_counter() - grids_loaded
+    print(f"{rows.size} creatures on {len(layouts)} layouts: grids loaded in {grids_loaded - start:.2f}s, "
+          f"evaluated in {elapsed:.2f}s ({batch.frame} frames)")
+
+    for layout, layout_fitness, layout_reached in zip(layouts, fitness, reached_goal):
+        print(f"{layout.name:>16}: best fitness {layout_fitness.max():.4f}, mean {layout_fitness.mean():.4f}, "
+              f"reached goal {int(layout_reached.sum())}/{rows.size}")
+    mean_fitness = fitness.mean(axis=0)
+    best = int(np.argmax(mean_fitness))
+    print(f"Best mean fitness over the layouts: {mean_fitness[best]:.4f} (creature {int(rows[best])}), "
+          f"reached goal on {int(reached_goal[:, best].sum())}/{len(layouts)} layouts")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'resume': args.resume, 'rows': rows.tolist(), 'seed': args.seed,
+                       'layouts': [layout.to_dict() for layout in layouts],
+                       'fitness': fitness.tolist(), 'reached_goal': reached_goal.tolist(),
+                       'mean_fitness': mean_fitness.tolist()}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
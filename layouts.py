@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import numpy as np
+from config import *
+from obstacle_config import *
+from course_grid import CourseGrid
+from geometry import any_rect_overlaps
+
+# Bumped whenever the tables of CourseGrid change, so grids cached by an older version are rebuilt
+GRID_VERSION = 2
+
+
+# Obstacles (x, y, width, height), goal and start of one course
+class Layout:
+
+    def __init__(self, obstacles, goal, start=START, name=None):
+        self.obstacles = [tuple(int(v) for v in obstacle) for obstacle in obstacles]
+        self.goal = tuple(int(v) for v in goal)
+        self.start = tuple(int(v) for v in start)
+        self.name = name or self.key[:8]
+
+    # Hash of everything the grid of the layout depends on (the field and creature size included)
+    @property
+    def key(self):
+        data = {'obstacles': self.obstacles, 'goal': self.goal, 'field': [WIDTH, HEIGHT, CREATURE_SIZE],
+                'version': GRID_VERSION}
+        return hashlib.sha1(json.dumps(data).encode()).hexdigest()
+
+    def to_dict(self):
+        return {'name': self.name, 'obstacles': self.obstacles, 'goal': self.goal, 'start': self.start}
+
+    @staticmethod
+    def from_dict(data):
+        return Layout(data['obstacles'], data.get('goal', GOAL), data.get('start', START), data.get('name'))
+
+
+# The layout of obstacle_config.py
+def default_layout():
+    return Layout(OBSTACLES, GOAL, START, 'default')
+
+
+# Load layouts from a .json file (one layout or a list of them) or from every .json file of a directory
+def load_layouts(path):
+    if os.path.isdir(path):
+        return [layout for name in sorted(os.listdir(path)) if name.endswith('.json')
+                for layout in load_layouts(os.path.join(path, name))]
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('layouts', [data])
+    return [Layout.from_dict(layout) for layout in data]
+
+
+# Save layouts to a .json file readable by load_layouts
+def save_layouts(path, layouts):
+    with open(path, 'w') as f:
+        json.dump({'layouts': [layout.to_dict() for layout in layouts]}, f, indent=2)
+
+
+# Random obstacles keeping the start and goal clear
+def random_obstacles(count, rng, goal=GOAL, start=START):
+    obstacles = []
+    while len(obstacles) < count:
+        width, height = rng.integers(10, 80, 2)
+        x, y = rng.integers(0, WIDTH - width), rng.integers(0, HEIGHT - height)
+        rect = (int(x), int(y), int(width), int(height))
+        if not any_rect_overlaps([rect], [start[0], goal[0]], [start[1], goal[1]], 4 * CREATURE_SIZE).any():
+            obstacles.append(rect)
+    return obstacles
+
+
+# Generate count layouts of random obstacles around the course goal and start
+def generate_layouts(count, obstacle_count=40, seed=0, goal=GOAL, start=START):
+    rng = np.random.default_rng(seed)
+    return [Layout(random_obstacles(obstacle_count, rng, goal, start), goal, start, f'random-{seed}-{i}')
+            for i in range(count)]
+
+
+# Grid of a layout with every table computed, cached in cache_dir as <layout key>.npz (None never caches)
+def load_grid(layout, cache_dir=LAYOUT_CACHE_DIR):
+    if cache_dir is None:
+        return CourseGrid(layout.obstacles, layout.goal).precompute()
+    filename = os.path.join(cache_dir, layout.key + '.npz')
+    if os.path.exists(filename):
+        return CourseGrid.load(filename)
+
+    grid = CourseGrid(layout.obstacles, layout.goal).precompute()
+    os.makedirs(cache_dir, exist_ok=True)
+    # Written under a temporary name so other processes never load a partial file
+    temporary = f'{filename}.{os.getpid()}.tmp'
+    grid.save(temporary)
+    os.replace(temporary, filename)
+    return grid
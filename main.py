@@ -1,7 +1,7 @@
+import os
 import pygame
 from config import *
 from course import ObstacleCourse
-from video_utils import ensure_dir, create_video, record_frame, cleanup_frames
 
 # Initialize Pygame
 pygame.init()
@@ -15,55 +15,72 @@ def main():
     course = ObstacleCourse()
     running = True
     save_file = "best_creature.pkl"
-    frame_number = 0
+    steps_per_frame = STEPS_PER_FRAME
     
     if RECORD_SIMULATION:
-        temp_dir = "temp_frames"
-        ensure_dir(temp_dir)
+        from video_utils import VideoRecorder
+        recorder = VideoRecorder("simulation_video.mp4")
 
     # Set up the display
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Genetic Algorithm + Reinforcement Learning Obstacle Course")
 
-    # Try to load the best creature at the start
-    course.load_best_creature(save_file)
+    # Try to resume from the checkpoint at the start (or load the best creature of older runs)
+    if os.path.exists(CHECKPOINT_FILE):
+        course.load_checkpoint(CHECKPOINT_FILE)
+    else:
+        course.load_best_creature(save_file)
+    if REPLAY_DIR:
+        course.record_replays(REPLAY_DIR)
 
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
+                # Checkpoints are written in the background, the HUD shows when the save is done
                 if event.key == pygame.K_s:
-                    course.save_best_creature(save_file)
+                    course.save_checkpoint(CHECKPOINT_FILE, background=True)
                 elif event.key == pygame.K_l:
-                    course.load_best_creature(save_file)
+                    course.load_checkpoint(CHECKPOINT_FILE)
+                # Speed up or slow down the simulation (steps per drawn frame)
+                elif event.key in (pygame.K_UP, pygame.K_DOWN):
+                    steps_per_frame = steps_per_frame * 2 if event.key == pygame.K_UP else max(1, steps_per_frame // 2)
+                    pygame.display.set_caption(f"Genetic Algorithm + Reinforcement Learning Obstacle Course "
+                                               f"({steps_per_frame} steps per frame)")
 
-        course.update()
+        # Several steps for every drawn frame, the last frame of a generation is always drawn
+        for _ in range(steps_per_frame):
+            course.update()
+            if course.is_generation_over():
+                break
         course.draw(screen)
         pygame.display.flip()
 
         
         if RECORD_SIMULATION:
             # Record every frame
-            record_frame(screen, frame_number, temp_dir)
-            frame_number += 1
+            recorder.record(screen)
 
-        if all(creature.is_dead or creature.reached_goal or creature.steps == MAX_STEPS for creature in course.population):
+        if course.is_generation_over():
             course.evolve()
             course.reset_population()
+            if AUTOSAVE_EVERY and course.generation % AUTOSAVE_EVERY == 0:
+                course.save_checkpoint(CHECKPOINT_FILE, background=True)
 
         clock.tick(FPS)
 
-    # Save the best creature before quitting
-    course.save_best_creature(save_file)
+    # Save the checkpoint before quitting (close waits for it to be written)
+    course.save_checkpoint(CHECKPOINT_FILE, background=True)
+    course.close()
+
+    if PROFILE:
+        course.profiler.export(PROFILE_FILE)
 
     
     if RECORD_SIMULATION:
-        # Create video from saved frames
-        create_video(temp_dir, "simulation_video.mp4")
-
-        # Clean up temporary frames
-        cleanup_frames(temp_dir)
+        # Finish writing the video
+        recorder.close()
 
     pygame.quit()
 
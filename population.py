@@ -0,0 +1,347 @@
+import numpy as np
+from config import *
+from obstacle_config import *
+from creature import (Creature, ACTIONS as CREATURE_ACTIONS, STEP_SIZE, CELL_SIZE, STATE_SHAPE, LATTICE_SHAPE,
+                      LATTICE_BYTES, BITS, HISTORY_LENGTH, unpack_bitmap)
+from qstore import make_q_store
+
+# Moves a creature can take (same order as Creature.actions)
+ACTIONS = np.array(CREATURE_ACTIONS, dtype=np.int64)
+
+# Arrays of a Population holding one row per creature (everything but the Q-Tables)
+ROW_ARRAYS = ('x', 'y', 'initial_x', 'initial_y', 'genes', 'fitness', 'steps', 'is_dead', 'reached_goal',
+              'epsilon', 'closest_distance_to_goal', 'direct_path_to_goal', 'last_state', 'last_action',
+              'visited_positions', 'path_length', 'previous_positions', 'history_head', 'history_length',
+              'stagnation_sum', 'novelty_cells', 'action_log', 'action_count')
+
+
+# Class that holds the whole generation as arrays (one row per creature) so it can be stepped at once
+class Population:
+
+    # Initialize every creature at (x, y) with random genes (genes=False leaves them at 0 for the caller to write)
+    # q_store holds the Q-Tables (a new store of the kind set by Q_STORE in config.py by default)
+    # config gives the parameters of the run (Config() by default)
+    def __init__(self, size, x, y, rng=None, q_store=None, genes=True, config=None):
+        self.size = size
+        self.config = config = config or Config()
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.origin = (x % STEP_SIZE, y % STEP_SIZE)
+
+        self.x = np.full(size, x, dtype=np.int64)
+        self.y = np.full(size, y, dtype=np.int64)
+        self.initial_x = self.x.copy()
+        self.initial_y = self.y.copy()
+        genes_shape = (size, config.max_steps * 2)
+        self.genes = self.rng.uniform(-1, 1, genes_shape) if genes else np.zeros(genes_shape)
+        self.fitness = np.zeros(size)
+        self.steps = np.zeros(size, dtype=np.int64)
+        self.is_dead = np.zeros(size, dtype=bool)
+        self.reached_goal = np.zeros(size, dtype=bool)
+        self.epsilon = np.full(size, config.start_epsilon, dtype=float)
+        self.closest_distance_to_goal = np.full(size, np.inf)
+        self.direct_path_to_goal = np.zeros(size, dtype=bool)
+
+        # Last state/action, -1 when the creature hasn't moved yet
+        self.last_state = np.full((size, 2), -1, dtype=np.int64)
+        self.last_action = np.full(size, -1, dtype=np.int64)
+
+        # Q-Table of each creature
+        self.q = q_store if q_store is not None else make_q_store(size)
+
+        # Positions traversed in this generation (packed bitmaps, same layout as Creature.visited)
+        self.visited_positions = np.zeros((size, LATTICE_SHAPE[0], LATTICE_BYTES), dtype=np.uint8)
+        self.path_length = np.zeros(size, dtype=np.int64)
+
+        # Last positions of each creature (ring buffers, history_head is the next slot written)
+        self.previous_positions = np.zeros((size, HISTORY_LENGTH, 2), dtype=np.int64)
+        self.history_head = np.zeros(size, dtype=np.int64)
+        self.history_length = np.zeros(size, dtype=np.int64)
+        # Running sum of the distances between consecutive previous positions (for the stagnation penalty)
+        self.stagnation_sum = np.zeros(size)
+
+        # Visited cell count when the creature reached the goal (its novelty score stops there), -1 otherwise
+        self.novelty_cells = np.full(size, -1, dtype=np.int64)
+
+        # Actions taken in this generation, 2 bits each (same layout as Creature.action_log)
+        self.action_log = np.zeros((size, config.action_log_bytes), dtype=np.uint8)
+        self.action_count = np.zeros(size, dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    # Get a standalone Creature with the state of one row
+    def __getitem__(self, i):
+        creature = Creature(int(self.x[i]), int(self.y[i]), self.config)
+        creature.initial_x = int(self.initial_x[i])
+        creature.initial_y = int(self.initial_y[i])
+        creature.genes = self.genes[i].copy()
+        creature.fitness = float(self.fitness[i])
+        creature.steps = int(self.steps[i])
+        creature.origin = self.origin
+        creature.visited = self.visited_positions[i].copy()
+        creature.path_length = int(self.path_length[i])
+        creature.is_dead = bool(self.is_dead[i])
+        creature.reached_goal = bool(self.reached_goal[i])
+        creature.epsilon = float(self.epsilon[i])
+        creature.closest_distance_to_goal = float(self.closest_distance_to_goal[i])
+        creature.direct_path_to_goal = bool(self.direct_path_to_goal[i])
+        if self.last_action[i] >= 0:
+            creature.last_state = tuple(int(v) for v in self.last_state[i])
+            creature.last_action = creature.actions[self.last_action[i]]
+        creature.previous_positions = self.previous_positions[i].copy()
+        creature.history_head = int(self.history_head[i])
+        creature.history_length = int(self.history_length[i])
+        creature.action_log = self.action_log[i].copy()
+        creature.action_count = int(self.action_count[i])
+        creature.q_table, creature.q_known = self.q.table(i)
+        return creature
+
+    # Overwrite one row with the state of a standalone Creature
+    def __setitem__(self, i, creature):
+        self.x[i], self.y[i] = creature.x, creature.y
+        self.initial_x[i], self.initial_y[i] = creature.initial_x, creature.initial_y
+        self.genes[i] = creature.genes
+        self.fitness[i] = creature.fitness
+        self.steps[i] = creature.steps
+        self.is_dead[i] = creature.is_dead
+        self.reached_goal[i] = creature.reached_goal
+        self.epsilon[i] = creature.epsilon
+        self.closest_distance_to_goal[i] = creature.closest_distance_to_goal
+        self.direct_path_to_goal[i] = creature.direct_path_to_goal
+        if creature.last_state is not None and creature.last_action is not None:
+            self.last_state[i] = creature.last_state
+            self.last_action[i] = creature.actions.index(creature.continuous_to_discrete_action(creature.last_action))
+        else:
+            self.last_state[i] = -1
+            self.last_action[i] = -1
+
+        if tuple(creature.origin) == self.origin:
+            self.visited_positions[i] = creature.visited
+        else:
+            self.visited_positions[i] = 0
+            for px, py in creature.get_path():
+                lx, ly = (px - self.origin[0]) // STEP_SIZE, (py - self.origin[1]) // STEP_SIZE
+                self.visited_positions[i, lx, ly >> 3] |= BITS[ly & 7]
+        self.path_length[i] = creature.path_length
+
+        self.previous_positions[i] = creature.previous_positions
+        self.history_head[i] = creature.history_head
+        self.history_length[i] = creature.history_length
+        history = np.reshape(creature.get_previous_positions(), (-1, 2))
+        self.stagnation_sum[i] = np.hypot(*np.diff(history, axis=0).T).sum()
+        self.novelty_cells[i] = -1
+        self.action_log[i] = creature.action_log
+        self.action_count[i] = creature.action_count
+
+        self.q.assign(i, creature.q_table, creature.q_known)
+
+    # Get the positions a creature traversed in this generation
+    def get_path(self, i):
+        lx, ly = np.nonzero(unpack_bitmap(self.visited_positions[i]))
+        return {(int(px) * STEP_SIZE + self.origin[0], int(py) * STEP_SIZE + self.origin[1]) for px, py in zip(lx, ly)}
+
+    # Get an empty population of the same size, generator and kind of Q-Table store (e.g. the buffer evolve writes
+    # the next generation into), genes and Q-Tables are left for the caller to write
+    def derive(self, x, y):
+        return Population(self.size, x, y, self.rng, self.q.derive(self.size), genes=False, config=self.config)
+
+    # Get a new population holding a copy of the given rows
+    def subset(self, rows, rng=None):
+        population = Population(len(rows), *self.origin, rng, make_q_store(len(rows), self.q.kind), config=self.config)
+        population.copy_rows(slice(None), self, rows)
+        return population
+
+    # Copy rows from another population
+    def copy_rows(self, rows, source, source_rows):
+        for name in ROW_ARRAYS:
+            getattr(self, name)[rows] = getattr(source, name)[source_rows]
+        self.q.copy_rows(rows, source.q, source_rows)
+
+    # Get the state (Q-Table cell) of the given creatures
+    def get_state(self, idx):
+        return self.x[idx] // CELL_SIZE, self.y[idx] // CELL_SIZE
+
+    # Move every given creature one step (batched version of Creature.move)
+    # replay=(action_log, action_count) of a recorded generation plays the logged actions instead of choosing them
+    # (no random draws, see replay.py)
+    def move(self, idx, replay=None):
+        config = self.config
+        idx = idx[self.steps[idx] < config.max_steps]
+        if idx.size == 0:
+            return
+        cx, cy = self.get_state(idx)
+
+        if replay is None:
+            # Reduce Epsilon as each steps taken, then pick random or best moves
+            self.epsilon[idx] *= config.decay
+            explore = self.rng.random(idx.size) < np.maximum(config.min_epsilon, self.epsilon[idx])
+            self.q.mark_known(idx[~explore], cx[~explore], cy[~explore])
+
+            # Moves that would lead to an already traversed position are not valid
+            new_x = self.x[idx, None] + ACTIONS[:, 0] * STEP_SIZE
+            new_y = self.y[idx, None] + ACTIONS[:, 1] * STEP_SIZE
+            valid = ~self.is_visited(idx[:, None], new_x, new_y)
+
+            # Random move is uniform among valid moves, best move is the highest Q-value among valid moves
+            random_choice = np.argmin(np.where(valid, self.rng.random(valid.shape), np.inf), axis=1)
+            best_choice = np.argmax(np.where(valid, self.q.values(idx, cx, cy), -np.inf), axis=1)
+            action = np.where(explore, random_choice, best_choice)
+            stuck = ~valid.any(axis=1)
+        else:
+            # The log of a creature ends where it had no valid move left
+            action_log, action_count = replay
+            t = self.action_count[idx]
+            stuck = t >= action_count[idx]
+            action = (action_log[idx, np.minimum(t >> 2, config.action_log_bytes - 1)] >> 2 * (t & 3)) & 3
+
+        # Creatures with no valid moves die where they stand
+        self.is_dead[idx[stuck]] = True
+        idx, cx, cy, action = idx[~stuck], cx[~stuck], cy[~stuck], action[~stuck]
+        self.log_actions(idx, action)
+        new_x = self.x[idx] + ACTIONS[action, 0] * STEP_SIZE
+        new_y = self.y[idx] + ACTIONS[action, 1] * STEP_SIZE
+
+        out_of_bounds = ((new_x < CREATURE_SIZE) | (new_x > WIDTH - CREATURE_SIZE) |
+                         (new_y < CREATURE_SIZE) | (new_y > HEIGHT - CREATURE_SIZE))
+        self.is_dead[idx[out_of_bounds]] = True
+        moved = idx[~out_of_bounds]
+        self.x[moved], self.y[moved] = new_x[~out_of_bounds], new_y[~out_of_bounds]
+        lx, ly = self.lattice_index(self.x[moved], self.y[moved])
+        self.visited_positions[moved, lx, ly >> 3] |= BITS[ly & 7]
+        self.path_length[moved] += 1
+        self.steps[moved] += 1
+
+        self.last_state[idx, 0], self.last_state[idx, 1] = cx, cy
+        self.last_action[idx] = action
+        self.remember_positions(idx)
+
+    # Append one action (index in ACTIONS) to the action log of each of the given creatures
+    def log_actions(self, idx, action):
+        t = self.action_count[idx]
+        self.action_log[idx, t >> 2] |= (action << 2 * (t & 3)).astype(np.uint8)
+        self.action_count[idx] += 1
+
+    # Lattice position (indexes of the visited bitmaps) of pixel positions
+    def lattice_index(self, x, y):
+        return (x - self.origin[0]) // STEP_SIZE, (y - self.origin[1]) // STEP_SIZE
+
+    # Check if creatures already traversed the positions (x, y) in this generation
+    def is_visited(self, idx, x, y):
+        lx, ly = self.lattice_index(x, y)
+        return (self.visited_positions[idx, lx, ly >> 3] & BITS[ly & 7]) != 0
+
+    # Slot of the newest previous position of the given creatures
+    def newest_slot(self, idx):
+        return (self.history_head[idx] - 1) % HISTORY_LENGTH
+
+    # Get the previous positions of one creature, oldest first
+    def get_previous_positions(self, i):
+        slots = (self.history_head[i] - self.history_length[i] + np.arange(self.history_length[i])) % HISTORY_LENGTH
+        return self.previous_positions[i, slots]
+
+    # Write the current position in the history ring buffer of the given creatures (overwriting the oldest one)
+    # The distance to the newest position is added to the stagnation sum and the one from the dropped position removed
+    def remember_positions(self, idx):
+        count = self.history_length[idx]
+        head = self.history_head[idx]
+        last = self.previous_positions[idx, self.newest_slot(idx)]
+        added = np.where(count > 0, np.hypot(self.x[idx] - last[:, 0], self.y[idx] - last[:, 1]), 0)
+        oldest = self.previous_positions[idx, head]
+        second = self.previous_positions[idx, (head + 1) % HISTORY_LENGTH]
+        removed = np.where(count == HISTORY_LENGTH, np.hypot(*(second - oldest).T), 0)
+        self.stagnation_sum[idx] += added - removed
+
+        self.previous_positions[idx, head, 0] = self.x[idx]
+        self.previous_positions[idx, head, 1] = self.y[idx]
+        self.history_head[idx] = (head + 1) % HISTORY_LENGTH
+        self.history_length[idx] = np.minimum(count + 1, HISTORY_LENGTH)
+
+    # Update Q-Table of the given creatures after their moves (batched version of Creature.update_q_table)
+    def update_q_table(self, idx, reward, new_cx, new_cy):
+        has_moved = self.last_action[idx] >= 0
+        idx, reward, new_cx, new_cy = idx[has_moved], reward[has_moved], new_cx[has_moved], new_cy[has_moved]
+        last_cx, last_cy = self.last_state[idx, 0], self.last_state[idx, 1]
+        action = self.last_action[idx]
+
+        self.q.mark_known(idx, last_cx, last_cy)
+        old_q = self.q.values(idx, last_cx, last_cy)[np.arange(idx.size), action]
+        self.q.mark_known(idx, new_cx, new_cy)
+        max_future_q = self.q.values(idx, new_cx, new_cy).max(axis=1)
+
+        learning_rate = self.config.learning_rate
+        new_q = (1 - learning_rate) * old_q + learning_rate * (reward + self.config.discount_factor * max_future_q)
+        self.q.set_values(idx, last_cx, last_cy, action, new_q)
+
+    # Give penalty if creatures stay in one place (batched version of Creature.calculate_stagnation_penalty)
+    def calculate_stagnation_penalty(self, idx):
+        count = self.history_length[idx]
+        avg_distance = self.stagnation_sum[idx] / np.maximum(count - 1, 1)
+        return np.where(count < 2, 0, np.maximum(0, 1 - avg_distance) * 0.5)
+
+    # Keep the closest distance to the goal reached by the given creatures
+    def update_closest_distance(self, idx, distance):
+        self.closest_distance_to_goal[idx] = np.minimum(self.closest_distance_to_goal[idx], distance)
+
+    # Calculate the score/fitness of the given creatures from their current state (batched version of
+    # Creature.calculate_fitness, the closest distance is kept by update_closest_distance)
+    # Creatures that reached the goal use the visited cell count of novelty_cells instead of visited_cell_count
+    # distances=(current, initial) gives the distances to the goal when they aren't the straight line (see
+    # CourseGrid.goal_distance), closest_distance_to_goal is then kept in the same unit
+    def calculate_fitness(self, idx, goal, obstacle_count, visited_cell_count, distances=None):
+        if distances is None:
+            current_distance = np.hypot(self.x[idx] - goal[0], self.y[idx] - goal[1])
+            initial_distance = np.hypot(self.initial_x[idx] - goal[0], self.initial_y[idx] - goal[1])
+        else:
+            current_distance, initial_distance = distances
+        distance_score = 1 / (current_distance + 1)
+
+        alive = ~self.is_dead[idx]
+        closest = self.closest_distance_to_goal[idx]
+        progress_score = (initial_distance - closest) / 100
+
+        exploration_score = self.path_length[idx] / (WIDTH * HEIGHT) * 10
+        obstacle_penalty = obstacle_count * 0.1
+        novelty_cells = np.where(self.novelty_cells[idx] >= 0, self.novelty_cells[idx], visited_cell_count)
+        novelty_score = novelty_cells / (WIDTH * HEIGHT / 100) * 5
+        stagnation_penalty = self.calculate_stagnation_penalty(idx)
+        survival_bonus = self.steps[idx] / self.config.max_steps
+
+        fitness = (
+            distance_score +
+            progress_score +
+            exploration_score +
+            novelty_score +
+            survival_bonus -
+            obstacle_penalty -
+            stagnation_penalty
+        )
+        fitness = np.where(self.reached_goal[idx], fitness + self.config.goal_reward, fitness)
+        self.fitness[idx] = np.where(alive, fitness, 0)
+
+    # Reset the per-generation state of every creature and put them at (x, y)
+    def reset(self, x, y):
+        self.origin = (x % STEP_SIZE, y % STEP_SIZE)
+        self.x[:], self.y[:] = x, y
+        self.initial_x[:], self.initial_y[:] = x, y
+        self.steps[:] = 0
+        self.visited_positions[:] = 0
+        self.path_length[:] = 0
+        self.is_dead[:] = False
+        self.reached_goal[:] = False
+        self.last_state[:] = -1
+        self.last_action[:] = -1
+        self.closest_distance_to_goal[:] = np.inf
+        self.novelty_cells[:] = -1
+        self.action_log[:] = 0
+        self.action_count[:] = 0
+        self.epsilon[:] = self.config.start_epsilon
+
+    # Put every row back to a new creature at (x, y), reusing the arrays (genes and Q-Tables are left to be overwritten)
+    def clear(self, x, y):
+        self.reset(x, y)
+        self.fitness[:] = 0
+        self.direct_path_to_goal[:] = False
+        self.previous_positions[:] = 0
+        self.history_head[:] = 0
+        self.history_length[:] = 0
+        self.stagnation_sum[:] = 0
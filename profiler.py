@@ -0,0 +1,114 @@
+import csv
+import json
+import time
+from contextlib import nullcontext
+
+# Context manager returned for every phase when profiling is disabled (nothing is measured)
+_DISABLED = nullcontext()
+
+
+# Times a phase and adds it to the profiler when the with block ends
+class _PhaseTimer:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Class that times each phase of the training loop (move, collision, fitness, draw, evolve, ...)
+# Phases are timed with "with profiler.phase(name):", which does nothing unless the profiler is enabled
+class Profiler:
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.timers = {}
+        # Seconds and calls of each phase for the current generation
+        self.phases = {}
+        self.frames = 0
+        # One row per finished generation
+        self.generations = []
+
+    # Context manager timing one phase
+    def phase(self, name):
+        if not self.enabled:
+            return _DISABLED
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = _PhaseTimer(self, name)
+        return timer
+
+    # Add time spent in a phase
+    def add(self, name, seconds, calls=1):
+        phase = self.phases.setdefault(name, [0.0, 0])
+        phase[0] += seconds
+        phase[1] += calls
+
+    # Count frames of the current generation
+    def end_frame(self, count=1):
+        if self.enabled:
+            self.frames += count
+
+    # Add the phases measured by another profiler (e.g. the shards simulated by worker processes)
+    def merge(self, phases):
+        for name, (seconds, calls) in phases.items():
+            self.add(name, seconds, calls)
+
+    # Get and clear the phases of the current generation
+    def take(self):
+        phases, self.phases, self.frames = self.phases, {}, 0
+        return phases
+
+    # Close the row of a generation
+    def end_generation(self, generation):
+        if not self.enabled:
+            return
+        frames = self.frames
+        phases = self.take()
+        self.generations.append({'generation': generation, 'frames': frames,
+                                 'phases': {name: {'seconds': seconds, 'calls': calls}
+                                            for name, (seconds, calls) in phases.items()}})
+
+    # Totals of every phase over the finished generations
+    def summary(self):
+        frames = sum(row['frames'] for row in self.generations)
+        totals = {}
+        for row in self.generations:
+            for name, phase in row['phases'].items():
+                total = totals.setdefault(name, {'seconds': 0.0, 'calls': 0})
+                total['seconds'] += phase['seconds']
+                total['calls'] += phase['calls']
+        measured = sum(total['seconds'] for total in totals.values())
+        for total in totals.values():
+            total['ms_per_call'] = 1000 * total['seconds'] / max(total['calls'], 1)
+            total['ms_per_frame'] = 1000 * total['seconds'] / max(frames, 1)
+            total['share'] = total['seconds'] / measured if measured else 0.0
+        return {'generations': len(self.generations), 'frames': frames, 'seconds': measured, 'phases': totals}
+
+    # Write the summary and the per generation rows to a .json file, or the rows to a .csv file
+    def export(self, filename):
+        if filename.endswith('.csv'):
+            with open(filename, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['generation', 'frames', 'phase', 'seconds', 'calls'])
+                for row in self.generations:
+                    for name, phase in row['phases'].items():
+                        writer.writerow([row['generation'], row['frames'], name, phase['seconds'], phase['calls']])
+        else:
+            with open(filename, 'w') as f:
+                json.dump({'summary': self.summary(), 'generations': self.generations}, f, indent=2)
+        print(f"Profile saved to {filename}")
+
+    # Lines for the HUD: mean milliseconds per frame of each phase in the current generation (slowest first)
+    def hud_lines(self):
+        frames = max(self.frames, 1)
+        phases = sorted(self.phases.items(), key=lambda item: -item[1][0])
+        return [f"{name}: {1000 * seconds / frames:.2f} ms" for name, (seconds, calls) in phases]
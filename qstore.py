@@ -0,0 +1,261 @@
+import numpy as np
+from config import *
+from creature import ACTIONS, STATE_SHAPE
+
+# Marks a state the creature has never seen in the row index of CowQStore
+UNKNOWN = -1
+# Pool row shared by every known state that still has all Q-values at 0
+ZERO_ROW = 0
+
+
+# Q-Tables of a whole population, one dense (16, 12, 4) table per creature
+class DenseQStore:
+    kind = 'dense'
+
+    def __init__(self, size):
+        self.size = size
+        self.q_table = np.zeros((size, *STATE_SHAPE, len(ACTIONS)))
+        self.q_known = np.zeros((size, *STATE_SHAPE), dtype=bool)
+
+    # Get an empty store for the next generation
+    def derive(self, size):
+        return DenseQStore(size)
+
+    # Q-values of state (cx, cy) for the given creatures
+    def values(self, idx, cx, cy):
+        return self.q_table[idx, cx, cy]
+
+    # Set the Q-value of one action of state (cx, cy) for the given creatures
+    def set_values(self, idx, cx, cy, action, values):
+        self.q_table[idx, cx, cy, action] = values
+
+    # Mark state (cx, cy) as seen by the given creatures
+    def mark_known(self, idx, cx, cy):
+        self.q_known[idx, cx, cy] = True
+
+    # Full Q-Table and known states of one creature
+    def table(self, i):
+        return self.q_table[i].copy(), self.q_known[i].copy()
+
+    # Overwrite the Q-Table of one creature
+    def assign(self, i, q_table, q_known):
+        self.q_table[i] = q_table
+        self.q_known[i] = q_known
+
+    # Copy the tables of rows from another store of the same kind
+    def copy_rows(self, rows, source, source_rows):
+        self.q_table[rows] = source.q_table[source_rows]
+        self.q_known[rows] = source.q_known[source_rows]
+
+    # Children inherit the tables of both parents (states known by parent2 take precedence)
+    def inherit(self, children, source, parent1, parent2):
+        known2 = source.q_known[parent2]
+        self.q_table[children] = np.where(known2[..., None], source.q_table[parent2], source.q_table[parent1])
+        self.q_known[children] = source.q_known[parent1] | known2
+
+    # Add Gaussian noise to the Q-values of known states, each value with probability rate
+    def mutate(self, rows, rate, scale, rng):
+        q_table = self.q_table[rows]
+        mask = (rng.random(q_table.shape) < rate) & self.q_known[rows][..., None]
+        q_table[mask] += rng.normal(0, scale, mask.sum())
+        self.q_table[rows] = q_table
+
+    # States creatures don't know yet take the values of a shared table (for the states marked in known)
+    def seed(self, q_table, known):
+        unknown = ~self.q_known & known
+        self.q_table[unknown] = np.broadcast_to(q_table, self.q_table.shape)[unknown]
+        self.q_known |= known
+
+    # Nothing is shared, nothing to free
+    def compact(self):
+        pass
+
+    # Memory used by the tables, compared to one dense table per creature
+    def memory_report(self):
+        used = self.q_table.nbytes + self.q_known.nbytes
+        return {'store': self.kind, 'bytes': used, 'dense_bytes': used, 'rows': self.size * self.q_known[0].size}
+
+    # Arrays holding the whole store (e.g. to save a checkpoint), see q_store_from_arrays
+    def to_arrays(self):
+        return {'q_table': self.q_table.copy(), 'q_known': self.q_known.copy()}
+
+
+# Q-Tables of a whole population where creatures share rows (the 4 Q-values of a state) copy-on-write
+# Children point to their parents' rows and only get a private copy of a row when they modify it
+class CowQStore:
+    kind = 'cow'
+
+    def __init__(self, size, pool=None):
+        self.size = size
+        self.row_index = np.full((size, *STATE_SHAPE), UNKNOWN, dtype=np.int32)
+        self.pool = pool if pool is not None else RowPool()
+
+    # Get an empty store for the next generation (sharing the same pool of rows)
+    def derive(self, size):
+        return CowQStore(size, self.pool)
+
+    def values(self, idx, cx, cy):
+        return self.pool.rows[np.maximum(self.row_index[idx, cx, cy], ZERO_ROW)]
+
+    def set_values(self, idx, cx, cy, action, values):
+        rows = self.private_rows(idx, cx, cy)
+        self.pool.rows[rows, action] = values
+
+    def mark_known(self, idx, cx, cy):
+        rows = self.row_index[idx, cx, cy]
+        self.row_index[idx, cx, cy] = np.maximum(rows, ZERO_ROW)
+
+    def table(self, i):
+        rows = self.row_index[i]
+        return self.pool.rows[np.maximum(rows, ZERO_ROW)].copy(), rows != UNKNOWN
+
+    def assign(self, i, q_table, q_known):
+        rows = self.row_index[i]
+        self.pool.release(rows[rows > ZERO_ROW])
+        new_rows = self.pool.allocate(int(q_known.sum()))
+        self.pool.rows[new_rows] = q_table[q_known]
+        rows[:] = UNKNOWN
+        rows[q_known] = new_rows
+
+    # Make sure the given (creature, state) pairs own their row, copying shared rows first
+    def private_rows(self, idx, cx, cy):
+        rows = self.row_index[idx, cx, cy]
+        shared = (rows <= ZERO_ROW) | (self.pool.refcount[np.maximum(rows, ZERO_ROW)] > 1)
+        if shared.any():
+            old_rows = np.maximum(rows[shared], ZERO_ROW)
+            new_rows = self.pool.allocate(old_rows.size)
+            self.pool.rows[new_rows] = self.pool.rows[old_rows]
+            self.pool.release(old_rows[old_rows > ZERO_ROW])
+            rows[shared] = new_rows
+            self.row_index[idx[shared], cx[shared], cy[shared]] = new_rows
+        return rows
+
+    def copy_rows(self, rows, source, source_rows):
+        index = source.row_index[source_rows]
+        if source.pool is not self.pool:
+            # Rows of another pool (e.g. a shard simulated in another process) are imported once each
+            used = np.unique(index[index > ZERO_ROW])
+            remap = np.full(len(source.pool.rows), UNKNOWN, dtype=np.int32)
+            remap[ZERO_ROW] = ZERO_ROW
+            remap[used] = self.pool.allocate(used.size, references=0)
+            self.pool.rows[remap[used]] = source.pool.rows[used]
+            index = np.where(index >= ZERO_ROW, remap[np.maximum(index, ZERO_ROW)], UNKNOWN)
+        self.pool.retain(index[index > ZERO_ROW])
+        self.row_index[rows] = index
+
+    def inherit(self, children, source, parent1, parent2):
+        index2 = source.row_index[parent2]
+        index = np.where(index2 != UNKNOWN, index2, source.row_index[parent1])
+        if source.pool is not self.pool:
+            raise ValueError("Children must be created in a store sharing the parents' pool")
+        self.pool.retain(index[index > ZERO_ROW])
+        self.row_index[children] = index
+
+    # Mutated values need a private row, the same random draws as DenseQStore.mutate give the same tables
+    def mutate(self, rows, rate, scale, rng):
+        index = self.row_index[rows]
+        mask = (rng.random((*index.shape, len(ACTIONS))) < rate) & (index != UNKNOWN)[..., None]
+        noise = rng.normal(0, scale, mask.sum())
+        child, cx, cy, action = np.nonzero(mask)
+        creatures = np.arange(self.size)[rows][child]
+
+        pairs = np.unique(np.stack([creatures, cx, cy]), axis=1)
+        self.private_rows(pairs[0], pairs[1], pairs[2])
+        self.pool.rows[self.row_index[creatures, cx, cy], action] += noise
+
+    # Each state of the shared table gets one row, shared copy-on-write by every creature it seeds
+    def seed(self, q_table, known):
+        shared = np.full(STATE_SHAPE, UNKNOWN, dtype=np.int32)
+        shared[known] = self.pool.allocate(int(known.sum()), references=0)
+        self.pool.rows[shared[known]] = q_table[known]
+        unknown = (self.row_index == UNKNOWN) & known
+        self.row_index[unknown] = np.broadcast_to(shared, self.row_index.shape)[unknown]
+        self.pool.retain(self.row_index[unknown])
+
+    # Free the rows no longer used by this store (rows only used by previous generations)
+    def compact(self):
+        self.pool.collect(self.row_index)
+
+    def memory_report(self):
+        used = self.row_index.nbytes + self.pool.nbytes()
+        dense = self.row_index.size * (len(ACTIONS) * 8 + 1)
+        return {'store': self.kind, 'bytes': used, 'dense_bytes': dense, 'rows': self.pool.count - ZERO_ROW - 1 - self.pool.free.size,
+                'shared_rows': int(np.sum(self.pool.refcount[ZERO_ROW + 1:self.pool.count] > 1))}
+
+    # Only the rows in use are kept, renumbered from ZERO_ROW + 1 (shared rows stay shared)
+    def to_arrays(self):
+        used = np.unique(self.row_index[self.row_index > ZERO_ROW])
+        remap = np.full(self.pool.count, UNKNOWN, dtype=np.int32)
+        remap[ZERO_ROW] = ZERO_ROW
+        remap[used] = np.arange(ZERO_ROW + 1, ZERO_ROW + 1 + used.size)
+        row_index = np.where(self.row_index >= ZERO_ROW, remap[np.maximum(self.row_index, ZERO_ROW)], UNKNOWN)
+        return {'row_index': row_index.astype(np.int32), 'rows': self.pool.rows[np.concatenate([[ZERO_ROW], used])]}
+
+
+# Growable array of Q-value rows with a reference count per row
+class RowPool:
+
+    def __init__(self, capacity=1024):
+        self.rows = np.zeros((capacity, len(ACTIONS)))
+        self.refcount = np.zeros(capacity, dtype=np.int64)
+        self.count = ZERO_ROW + 1
+        self.free = np.empty(0, dtype=np.int64)
+
+    # Get n rows (reusing freed rows first) with the given reference count
+    def allocate(self, n, references=1):
+        reused, self.free = self.free[:n], self.free[n:]
+        fresh = n - reused.size
+        if self.count + fresh > len(self.rows):
+            capacity = max(2 * len(self.rows), self.count + fresh)
+            self.rows = np.concatenate([self.rows, np.zeros((capacity - len(self.rows), len(ACTIONS)))])
+            self.refcount = np.concatenate([self.refcount, np.zeros(capacity - len(self.refcount), dtype=np.int64)])
+        new_rows = np.concatenate([reused, np.arange(self.count, self.count + fresh)]).astype(np.int32)
+        self.count += fresh
+        self.refcount[new_rows] = references
+        return new_rows
+
+    def retain(self, rows):
+        np.add.at(self.refcount, rows, 1)
+
+    def release(self, rows):
+        np.subtract.at(self.refcount, rows, 1)
+
+    # Recount references from the row indexes still in use and free every other row
+    def collect(self, *row_indexes):
+        self.refcount[:] = 0
+        for index in row_indexes:
+            self.retain(index[index > ZERO_ROW])
+        unused = np.flatnonzero(self.refcount[ZERO_ROW + 1:self.count] == 0) + ZERO_ROW + 1
+        self.rows[unused] = 0
+        self.free = unused
+
+    def nbytes(self):
+        return self.count * (self.rows.itemsize * len(ACTIONS) + self.refcount.itemsize)
+
+
+# Rebuild a Q-Table store from the arrays of its to_arrays()
+def q_store_from_arrays(kind, arrays):
+    if kind == 'dense':
+        store = DenseQStore(len(arrays['q_table']))
+        store.q_table[:] = arrays['q_table']
+        store.q_known[:] = arrays['q_known']
+        return store
+    if kind == 'cow':
+        rows = arrays['rows']
+        store = CowQStore(len(arrays['row_index']), RowPool(max(len(rows), 1024)))
+        store.pool.rows[:len(rows)] = rows
+        store.pool.count = len(rows)
+        store.row_index[:] = arrays['row_index']
+        store.compact()
+        return store
+    raise ValueError(f"Unknown Q-Table store {kind!r}")
+
+
+# Create the Q-Table store selected by Q_STORE in config.py
+def make_q_store(size, kind=None):
+    kind = kind or Q_STORE
+    if kind == 'dense':
+        return DenseQStore(size)
+    if kind == 'cow':
+        return CowQStore(size)
+    raise ValueError(f"Unknown Q-Table store {kind!r}")
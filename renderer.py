@@ -0,0 +1,111 @@
+import numpy as np
+import pygame
+from config import *
+from creature import STEP_SIZE, HISTORY_LENGTH, unpack_bitmap
+
+TRAIL_COLOR = (255, 200, 200)
+
+
+# Class that draws an ObstacleCourse incrementally: the obstacles are drawn once, trails are kept
+# on a persistent layer where only the newest point of each creature is added every frame
+class Renderer:
+
+    def __init__(self):
+        self.font = pygame.font.Font(None, 36)
+        self.text_cache = {}
+        self.sprites = {color: self.make_sprite(color) for color in (RED, GRAY, YELLOW, BLUE)}
+        self.layout = None
+        self.background = None
+        self.trails = None
+        self.generation = None
+        self.frame = None
+
+    # Creature circle drawn once and blitted for every creature
+    def make_sprite(self, color):
+        sprite = pygame.Surface((CREATURE_SIZE * 2 + 1, CREATURE_SIZE * 2 + 1), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, color, (CREATURE_SIZE, CREATURE_SIZE), CREATURE_SIZE)
+        return sprite
+
+    # Draw the static part of the course (obstacles and goal)
+    def draw_background(self, course):
+        self.background = pygame.Surface((WIDTH, HEIGHT))
+        self.background.fill(WHITE)
+        for obstacle in course.obstacles:
+            pygame.draw.rect(self.background, BLACK, obstacle)
+        pygame.draw.circle(self.background, GREEN, course.goal, CREATURE_SIZE)
+        self.layout = course.grid
+
+    # Get a text surface, rendered only when the text changes
+    def text(self, key, text):
+        cached = self.text_cache.get(key)
+        if cached is None or cached[0] != text:
+            cached = (text, self.font.render(text, True, BLUE))
+            self.text_cache[key] = cached
+        return cached[1]
+
+    # Add trail points to the trail layer
+    def plot(self, x, y):
+        pixels = pygame.surfarray.pixels3d(self.trails)
+        pixels[x, y] = TRAIL_COLOR
+        del pixels
+
+    # Bring the trail layer up to date with the course
+    def update_trails(self, course):
+        population = course.population
+        if self.layout is not course.grid:
+            self.draw_background(course)
+            self.generation = None
+
+        if course.generation != self.generation or course.frame < self.frame:
+            self.trails = self.background.copy()
+            self.generation = course.generation
+            self.frame = 0
+
+        skipped = course.frame - self.frame
+        if 0 < skipped <= HISTORY_LENGTH:
+            # Only the newest points of each creature that moved in this generation (one per frame since the last draw,
+            # no more than the creature's steps so positions of the previous generation are never plotted)
+            moved = np.flatnonzero(population.steps > 0)
+            back = np.minimum(skipped, population.steps[moved])
+            newest = population.newest_slot(moved)
+            for j in range(skipped):
+                rows = back > j
+                points = population.previous_positions[moved[rows], (newest[rows] - j) % HISTORY_LENGTH]
+                self.plot(points[:, 0], points[:, 1])
+        elif skipped:
+            # Frames were skipped, redraw every traversed position
+            self.trails = self.background.copy()
+            lx, ly = np.nonzero(unpack_bitmap(np.bitwise_or.reduce(population.visited_positions, axis=0)))
+            self.plot(lx * STEP_SIZE + population.origin[0], ly * STEP_SIZE + population.origin[1])
+        self.frame = course.frame
+
+    # Draw the scene on Pygame
+    def draw(self, screen, course):
+        population = course.population
+        self.update_trails(course)
+        screen.blit(self.trails, (0, 0))
+
+        # Every creature is a blit of a sprite of its color, the best creature is drawn last (on top)
+        colors = np.where(population.reached_goal, 2, np.where(population.is_dead, 1, 0))
+        sprites = [self.sprites[RED], self.sprites[GRAY], self.sprites[YELLOW]]
+        x = (population.x - CREATURE_SIZE).tolist()
+        y = (population.y - CREATURE_SIZE).tolist()
+        screen.blits([(sprites[c], (px, py)) for c, px, py in zip(colors.tolist(), x, y)], doreturn=False)
+        if course.best_index is not None:
+            screen.blit(self.sprites[BLUE], (x[course.best_index], y[course.best_index]))
+
+        screen.blit(self.text('generation', f"Generation: {course.generation}"), (10, 10))
+        screen.blit(self.text('fitness', f"Best Fitness: {course.best_fitness:.4f}"), (10, 50))
+        screen.blit(self.text('alive', f"Alive: {int(np.sum(~population.is_dead))}/{course.population_size}"), (10, 90))
+        screen.blit(self.text('goal', f"Reached Goal: {course.creatures_reached_goal}/{course.population_size}"), (10, 130))
+
+        # Progress of the checkpoint being written in the background
+        writer = course.checkpoint_writer
+        if writer is not None and writer.status:
+            screen.blit(self.text('checkpoint', writer.status), (10, HEIGHT - 30))
+
+        # Time of each phase when profiling is enabled
+        if course.profiler.enabled:
+            for i, line in enumerate(course.profiler.hud_lines()):
+                surface = self.text(('profile', i), line)
+                screen.blit(surface, (WIDTH - surface.get_width() - 10, 10 + 30 * i))
@@ -0,0 +1,128 @@
+import argparse
+import time
+import numpy as np
+from config import *
+from action_log import load_replay
+from course import ObstacleCourse
+from layouts import Layout
+from population import Population
+from qstore import make_q_store
+
+
+# Course playing back a generation recorded by ObstacleCourse.record_replays: every creature takes its logged
+# actions (nothing is chosen or learnt), collisions and the goal are checked on the recorded layout as in training
+# creatures selects the rows replayed (all of them by default), e.g. a single creature
+class ReplayCourse(ObstacleCourse):
+
+    def __init__(self, filename, creatures=None, profile=False):
+        self.metadata, self.recorded = load_replay(filename)
+        super().__init__(population_size=0, workers=1, seed=self.metadata['seed'], profile=profile,
+                         layout=Layout.from_dict(self.metadata['layout']),
+                         config=Config(**self.metadata.get('config', {})))
+        self.generation = self.metadata['generation']
+        count = len(self.recorded['action_count'])
+        self.creatures = np.arange(count) if creatures is None else np.asarray(creatures, dtype=np.int64)
+        self.rewind()
+
+    # Go back to the start of the generation
+    def rewind(self):
+        size = len(self.creatures)
+        self.replay_log = (self.recorded['action_log'][self.creatures], self.recorded['action_count'][self.creatures])
+        # The Q-Tables are never read, the copy-on-write store keeps them empty
+        self.population = Population(size, *self.start, q_store=make_q_store(size, 'cow'), genes=False,
+                                     config=self.config)
+        self.population_size = size
+        self.frame = 0
+        self.fitness_frame = 0
+        self.visited_cells[:] = False
+        self.creatures_reached_goal = 0
+        self.best_index = None
+        self.best_fitness = float('-inf')
+
+    # Play the generation up to a frame (going back rewinds and plays it again from the start)
+    def seek(self, frame):
+        if frame < self.frame:
+            self.rewind()
+        while self.frame < frame and not self.is_generation_over():
+            self.update()
+
+    # Rows of the replayed creatures that don't end where they were recorded (empty when the replay is exact)
+    def mismatches(self):
+        recorded = self.recorded
+        rows = self.creatures
+        population = self.population
+        same = ((population.x == recorded['x'][rows]) & (population.y == recorded['y'][rows]) &
+                (population.is_dead == recorded['is_dead'][rows]) &
+                (population.reached_goal == recorded['reached_goal'][rows]))
+        return rows[~same]
+
+
+# Play a recorded generation in a window: SPACE pauses, UP/DOWN double or halve the speed, RIGHT steps one frame
+# when paused, LEFT restarts and ESC quits
+def play(course, speed, fps):
+    import pygame
+
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    clock = pygame.time.Clock()
+    paused = False
+    running = True
+    while running:
+        step = 0 if paused else speed
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                elif event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_UP:
+                    speed *= 2
+                elif event.key == pygame.K_DOWN:
+                    speed = max(1, speed // 2)
+                elif event.key == pygame.K_RIGHT:
+                    step = 1
+                elif event.key == pygame.K_LEFT:
+                    course.rewind()
+
+        course.seek(course.frame + step)
+        course.draw(screen)
+        pygame.display.set_caption(f"Replay of generation {course.generation}: frame {course.frame}, "
+                                   f"x{speed}{' (paused)' if paused else ''}")
+        pygame.display.flip()
+        clock.tick(fps)
+    pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play back a generation recorded with --record-replays")
+    parser.add_argument("replay", help="replay file of a generation (e.g. replays/generation_00012.npz)")
+    parser.add_argument("--creatures", type=int, nargs="+", help="only replay these creatures (rows)")
+    parser.add_argument("--best", type=int, help="only replay the N fittest creatures")
+    parser.add_argument("--speed", type=int, default=1, help="frames simulated per drawn frame")
+    parser.add_argument("--fps", type=int, default=60, help="frame rate of the window")
+    parser.add_argument("--verify", action="store_true",
+                        help="replay without a window and check every creature ends where it was recorded")
+    args = parser.parse_args()
+
+    creatures = args.creatures
+    if args.best:
+        metadata, recorded = load_replay(args.replay)
+        creatures = np.argsort(-recorded['fitness'], kind='stable')[:args.best]
+    course = ReplayCourse(args.replay, creatures)
+
+    if args.verify:
+        start = time.perf_counter()
+        course.seek(course.metadata['frames'])
+        elapsed = time.perf_counter() - start
+        mismatches = course.mismatches()
+        print(f"Replayed {len(course.creatures)} creatures of generation {course.generation} "
+              f"({course.frame} frames) in {elapsed:.2f}s: "
+              f"{'exact' if mismatches.size == 0 else f'{mismatches.size} creatures differ: {mismatches[:10].tolist()}'}")
+        return
+    play(course, args.speed, args.fps)
+
+
+if __name__ == "__main__":
+    main()
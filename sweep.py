@@ -0,0 +1,174 @@
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+from config import *
+from course import ObstacleCourse
+from layouts import default_layout, load_grid, load_layouts
+
+# Columns of the results table, after the parameters of each configuration
+RESULT_COLUMNS = ('generations', 'first_goal', 'best_fitness', 'reached_goal', 'steps_per_sec', 'seconds')
+
+
+# Values tried for each parameter from "name=v1,v2,..." strings, or "name=low:high" ranges sampled uniformly
+# (ranges only make sense for random samples), values are converted to the type of the parameter in Config
+def parse_grid(specs):
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        name = Config.field(name)
+        if ':' in values:
+            low, high = values.split(':')
+            grid[name] = (Config.convert(name, low)[1], Config.convert(name, high)[1])
+        else:
+            grid[name] = [Config.convert(name, value)[1] for value in values.split(',')]
+    return grid
+
+
+# Every combination of the values of the grid
+def grid_configs(grid):
+    if any(isinstance(values, tuple) for values in grid.values()):
+        raise ValueError("low:high ranges need --samples")
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+# count random configurations: each parameter is one of its values or uniform in its range
+def sample_configs(grid, count, seed=None):
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(count):
+        params = {}
+        for name, values in grid.items():
+            if isinstance(values, tuple):
+                low, high = values
+                value = rng.integers(low, high + 1) if isinstance(low, int) else rng.uniform(low, high)
+            else:
+                value = values[rng.integers(len(values))]
+            params[name] = value.item() if isinstance(value, np.generic) else value
+        configs.append(params)
+    return configs
+
+
+# Layout and (already computed) grid shared by the runs of a worker process
+_worker_layout = None
+_worker_grid = None
+
+
+# Set up a worker process with the layout and grid every configuration trains on
+def _init_worker(layout, grid):
+    global _worker_layout, _worker_grid
+    _worker_layout = layout
+    _worker_grid = grid
+
+
+# Train one configuration headless until the generation or time budget is spent and return its results
+def _run_config(task):
+    index, params, generations, time_limit, seed, q_store = task
+    course = ObstacleCourse(workers=1, seed=seed, q_store=q_store, layout=_worker_layout, grid=_worker_grid,
+                            config=Config(**params))
+    first_goal = None
+    best_fitness = float('-inf')
+    reached_goal = 0
+    steps = 0
+    start = time.perf_counter()
+    while course.generation < generations and time.perf_counter() - start < time_limit:
+        course.run_generation()
+        steps += int(course.population.steps.sum())
+        best_fitness = max(best_fitness, course.best_fitness)
+        reached_goal = course.creatures_reached_goal
+        if first_goal is None and reached_goal:
+            first_goal = course.generation
+        course.evolve()
+        course.reset_population()
+    elapsed = time.perf_counter() - start
+    course.close()
+    return index, {**params, 'generations': course.generation, 'first_goal': first_goal,
+                   'best_fitness': best_fitness, 'reached_goal': reached_goal,
+                   'steps_per_sec': steps / elapsed if elapsed else 0.0, 'seconds': elapsed}
+
+
+# Train every configuration in parallel processes (one configuration per process at a time)
+# Returns the results in the order of configs
+def run_sweep(configs, generations, time_limit=float('inf'), workers=None, seed=SEED, q_store=Q_STORE, layout=None):
+    layout = layout or default_layout()
+    # The grid is loaded once here and handed to every worker
+    grid = load_grid(layout)
+    workers = min(workers or os.cpu_count() or 1, len(configs))
+    tasks = [(i, params, generations, time_limit, seed, q_store) for i, params in enumerate(configs)]
+    results = [None] * len(configs)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(layout, grid)) as pool:
+        for done, (index, result) in enumerate(pool.imap_unordered(_run_config, tasks), 1):
+            results[index] = result
+            print(f"[{done}/{len(configs)}] {format_params(configs[index])}: best fitness {result['best_fitness']:.4f}, "
+                  f"first goal {result['first_goal']}, {result['generations']} generations, "
+                  f"{result['steps_per_sec']:.0f} steps/sec")
+    return results
+
+
+# name=value text of some parameters
+def format_params(params):
+    return ' '.join(f'{name}={value:.4g}' if isinstance(value, float) else f'{name}={value}'
+                    for name, value in params.items())
+
+
+# Best configurations first: reaching the goal early, then the best fitness
+def rank(results):
+    return sorted(results, key=lambda r: (r['first_goal'] is None, r['first_goal'] or 0, -r['best_fitness']))
+
+
+# Write the results table to a .csv file, or a .json file of the configurations and results
+def save_results(filename, results, names):
+    if filename.endswith('.csv'):
+        with open(filename, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=[*names, *RESULT_COLUMNS])
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(filename, 'w') as f:
+            json.dump({'defaults': Config().to_dict(), 'results': results}, f, indent=2)
+    print(f"Results saved to {filename}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train many configurations in parallel headless processes and "
+                                                 "compare how fast they reach the goal")
+    parser.add_argument("--grid", nargs="+", required=True, metavar="NAME=VALUES",
+                        help="values of a parameter of Config, e.g. mutation_rate=0.05,0.1,0.2 "
+                             "(or learning_rate=0.01:0.5 ranges with --samples)")
+    parser.add_argument("--samples", type=int, default=0,
+                        help="train N random configurations instead of every combination of the grid")
+    parser.add_argument("--generations", type=int, default=20, help="generation budget of each configuration")
+    parser.add_argument("--time-limit", type=float, default=float('inf'),
+                        help="time budget of each configuration in seconds (no new generation starts after it)")
+    parser.add_argument("--workers", type=int, help="number of processes (all cores by default)")
+    parser.add_argument("--seed", type=int, default=SEED,
+                        help="seed of every run (and of the random configurations), so they only differ by their parameters")
+    parser.add_argument("--q-store", choices=["dense", "cow"], default=Q_STORE, help="Q-Table store")
+    parser.add_argument("--layout", help="train on the first layout of this .json file instead of obstacle_config.py")
+    parser.add_argument("--output", default="sweep.csv", help="save the results table to this .csv or .json file")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid)
+    configs = sample_configs(grid, args.samples, args.seed) if args.samples else grid_configs(grid)
+    layout = load_layouts(args.layout)[0] if args.layout else None
+    print(f"Training {len(configs)} configurations for {args.generations} generations"
+          f"{f' or {args.time_limit:g}s' if args.time_limit != float('inf') else ''} each")
+
+    start = time.perf_counter()
+    results = run_sweep(configs, args.generations, args.time_limit, args.workers, args.seed, args.q_store, layout)
+    print(f"Sweep done in {time.perf_counter() - start:.2f}s")
+    for result in rank(results):
+        params = {name: result[name] for name in grid}
+        print(f"{format_params(params)}: first goal {result['first_goal']}, best fitness {result['best_fitness']:.4f}, "
+              f"{result['steps_per_sec']:.0f} steps/sec")
+    if args.output:
+        save_results(args.output, rank(results), list(grid))
+
+
+if __name__ == "__main__":
+    main()
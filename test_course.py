@@ -0,0 +1,36 @@
+import numpy as np
+from config import *
+from obstacle_config import *
+from course import ObstacleCourse
+from layouts import Layout
+
+
+# Full height walls on either side of the start
+def walled_layout():
+    x = START[0]
+    return Layout([(x - 60, 0, 10, HEIGHT), (x + 50, 0, 10, HEIGHT)], GOAL, START, 'walls')
+
+
+# Creatures left of the left wall or right of the right wall
+def escaped(course):
+    x = course.population.x
+    return int(np.count_nonzero((x < START[0] - 60) | (x > START[0] + 60)))
+
+
+# Evolve one generation on the default course, then play the next one between the walls
+def play_walled_generation(workers, cache_dir):
+    course = ObstacleCourse(population_size=40, workers=workers, seed=0)
+    course.run_generation()
+    course.evolve()
+    course.use_layout(walled_layout(), cache_dir=cache_dir)
+    course.reset_population()
+    course.run_generation()
+    course.close()
+    return course
+
+
+# Switching layouts after a parallel generation must not leave the workers on the previous grid
+def test_use_layout_reaches_workers(tmp_path):
+    serial = play_walled_generation(1, str(tmp_path))
+    parallel = play_walled_generation(2, str(tmp_path))
+    assert escaped(serial) == escaped(parallel) == 0
@@ -0,0 +1,99 @@
+import numpy as np
+import pygame
+import pytest
+from config import *
+from obstacle_config import *
+from course_grid import CourseGrid
+from creature import ACTIONS, STEP_SIZE
+from layouts import random_obstacles
+
+
+# The checks of CourseGrid must give the same results as the Rect-based checks they replaced
+
+
+# Collision of a creature moving from old to new: its square overlaps an obstacle or the move clips one
+def rect_collision(obstacles, old_x, old_y, new_x, new_y):
+    creature_rect = pygame.Rect(new_x - CREATURE_SIZE, new_y - CREATURE_SIZE, CREATURE_SIZE * 2, CREATURE_SIZE * 2)
+    return (any(creature_rect.colliderect(obstacle) for obstacle in obstacles) or
+            any(obstacle.clipline((old_x, old_y), (new_x, new_y)) for obstacle in obstacles))
+
+
+def rect_direct_path(obstacles, x, y, goal):
+    return not any(obstacle.clipline((x, y), goal) for obstacle in obstacles)
+
+
+# Obstacles with a side crossed by the segment from (x, y) to the goal
+def segment_obstacle_count(obstacles, x, y, goal):
+    def line_intersection(line1, line2):
+        x1, y1, x2, y2 = line1
+        x3, y3, x4, y4 = line2
+        den = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
+        if den == 0:
+            return False
+        t = ((x1 - x3) * (y3 - y4) - (y1 - y3) * (x3 - x4)) / den
+        u = -((x1 - x2) * (y1 - y3) - (y1 - y2) * (x1 - x3)) / den
+        return 0 <= t <= 1 and 0 <= u <= 1
+
+    count = 0
+    for obstacle in obstacles:
+        lines = [(obstacle.left, obstacle.top, obstacle.right, obstacle.top),
+                 (obstacle.right, obstacle.top, obstacle.right, obstacle.bottom),
+                 (obstacle.right, obstacle.bottom, obstacle.left, obstacle.bottom),
+                 (obstacle.left, obstacle.bottom, obstacle.left, obstacle.top)]
+        if any(line_intersection((x, y, *goal), line) for line in lines):
+            count += 1
+    return count
+
+
+# The course of obstacle_config.py and a random one
+@pytest.fixture(scope='module', params=['default', 'random'])
+def course(request):
+    obstacles = OBSTACLES if request.param == 'default' else random_obstacles(40, np.random.default_rng(0))
+    return CourseGrid(obstacles, GOAL), [pygame.Rect(obstacle) for obstacle in obstacles]
+
+
+# Every position of the lattice creatures stand on (around START) whose moves stay inside the field
+def lattice_positions():
+    xs = np.arange(START[0] % STEP_SIZE, WIDTH + 1, STEP_SIZE)
+    ys = np.arange(START[1] % STEP_SIZE, HEIGHT + 1, STEP_SIZE)
+    x, y = np.meshgrid(xs[(xs >= STEP_SIZE) & (xs <= WIDTH - STEP_SIZE)],
+                       ys[(ys >= STEP_SIZE) & (ys <= HEIGHT - STEP_SIZE)], indexing='ij')
+    return x.ravel(), y.ravel()
+
+
+def test_collision_of_every_lattice_move(course):
+    grid, rects = course
+    x, y = lattice_positions()
+    for dx, dy in ACTIONS:
+        new_x, new_y = x + dx * STEP_SIZE, y + dy * STEP_SIZE
+        hits = grid.check_collision(x, y, new_x, new_y)
+        expected = [rect_collision(rects, *move) for move in zip(x.tolist(), y.tolist(), new_x.tolist(), new_y.tolist())]
+        assert hits.tolist() == expected
+
+
+def test_collision_of_random_diagonal_moves(course):
+    grid, rects = course
+    rng = np.random.default_rng(1)
+    x, y = rng.integers(0, WIDTH + 1, 5000), rng.integers(0, HEIGHT + 1, 5000)
+    new_x = np.clip(x + rng.integers(-30, 31, x.size), 0, WIDTH)
+    new_y = np.clip(y + rng.integers(-30, 31, y.size), 0, HEIGHT)
+    hits = grid.check_collision(x, y, new_x, new_y)
+    expected = [rect_collision(rects, *move) for move in zip(x.tolist(), y.tolist(), new_x.tolist(), new_y.tolist())]
+    assert hits.tolist() == expected
+
+
+def test_direct_path_and_obstacle_count(course):
+    grid, rects = course
+    x, y = lattice_positions()
+    assert grid.check_direct_path(x, y).tolist() == [rect_direct_path(rects, *position, GOAL)
+                                                     for position in zip(x.tolist(), y.tolist())]
+    assert grid.count_obstacles_between(x, y).tolist() == [segment_obstacle_count(rects, *position, GOAL)
+                                                           for position in zip(x.tolist(), y.tolist())]
+
+
+def test_single_positions(course):
+    grid, rects = course
+    x, y = START
+    assert bool(grid.check_collision(x, y, x + STEP_SIZE, y)) == rect_collision(rects, x, y, x + STEP_SIZE, y)
+    assert bool(grid.check_direct_path(x, y)) == rect_direct_path(rects, x, y, GOAL)
+    assert int(grid.count_obstacles_between(x, y)) == segment_obstacle_count(rects, x, y, GOAL)
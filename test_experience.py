@@ -0,0 +1,40 @@
+import numpy as np
+from config import *
+from course import ObstacleCourse
+
+
+# Play frames updates of the course, finishing and evolving the generations that end
+def play(course, frames):
+    for _ in range(frames):
+        if course.is_generation_over():
+            course.evolve()
+            course.reset_population()
+        course.update()
+
+
+# A run resumed from a checkpoint taken once the experience buffer wrapped around goes on like the uninterrupted run
+def test_resume_with_experience_replay(tmp_path):
+    config = Config(population_size=300, experience_size=5000, experience_seeding=True)
+    filename = str(tmp_path / 'checkpoint.npz')
+    course = ObstacleCourse(workers=1, seed=4, config=config)
+    course.run_generation()
+    course.evolve()
+    course.reset_population()
+    play(course, 100)
+    assert course.experience.count == course.experience.size and course.experience.head != 0
+    course.save_checkpoint(filename)
+
+    resumed = ObstacleCourse(population_size=10, workers=1, seed=99)
+    resumed.load_checkpoint(filename)
+    assert resumed.experience.head == course.experience.head
+
+    play(course, 5)
+    play(resumed, 5)
+    assert np.array_equal(course.experience.q_table, resumed.experience.q_table)
+
+    # The shared table seeds the Q-Tables of the next generation
+    for run in (course, resumed):
+        play(run, run.config.max_steps)
+        run.evaluate_fitness()
+    assert course.generation == resumed.generation
+    assert np.array_equal(course.population.fitness, resumed.population.fitness)
@@ -0,0 +1,121 @@
+import argparse
+import time
+from config import *
+from course import ObstacleCourse
+from layouts import load_layouts
+
+
+# Run one generation frame by frame while drawing it on screen, return the number of frames
+# Closing the window finishes the generation headless and stops rendering (returns False)
+def run_rendered_generation(course, screen, clock, fps):
+    import pygame
+
+    frames = 0
+    while not course.is_generation_over():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.display.quit()
+                return frames + course.run_generation(), False
+        course.update()
+        course.draw(screen)
+        pygame.display.flip()
+        frames += 1
+        if fps:
+            clock.tick(fps)
+    return frames, True
+
+
+# Headless training: run generations as fast as possible and report the throughput
+def main():
+    parser = argparse.ArgumentParser(description="Train the creatures without opening a window")
+    parser.add_argument("--generations", type=int, default=10, help="number of generations to run")
+    parser.add_argument("--render-every", type=int, default=0,
+                        help="draw every Kth generation in a window (0 never draws)")
+    parser.add_argument("--fps", type=int, default=0, help="frame rate cap for rendered generations (0 is uncapped)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="number of processes simulating each generation")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed for reproducible runs")
+    parser.add_argument("--q-store", choices=["dense", "cow"], default=Q_STORE,
+                        help="dense Q-Tables or rows shared copy-on-write between parents and children")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_FILE, default=PROFILE_FILE if PROFILE else None,
+                        help="time each phase and save the profile to this .json or .csv file")
+    parser.add_argument("--set", nargs="*", default=[], metavar="NAME=VALUE",
+                        help="change parameters of config.py for this run (e.g. mutation_rate=0.2 population_size=500)")
+    parser.add_argument("--layout", help="train on the first layout of this .json file instead of obstacle_config.py")
+    parser.add_argument("--record-replays", metavar="DIR", default=REPLAY_DIR,
+                        help="save the actions of every generation to DIR to play them back with replay.py")
+    parser.add_argument("--load", help="load the best creature from this file before training")
+    parser.add_argument("--save", help="save the best creature to this file after training")
+    parser.add_argument("--resume", help="resume training from this checkpoint (.npz, or a .pkl best creature)")
+    parser.add_argument("--checkpoint", help="save the whole training state to this .npz file after training")
+    parser.add_argument("--checkpoint-every", type=int, default=AUTOSAVE_EVERY,
+                        help="also save the checkpoint in the background every N generations (0 only saves at the end)")
+    args = parser.parse_args()
+
+    layout = load_layouts(args.layout)[0] if args.layout else None
+    course = ObstacleCourse(workers=args.workers, seed=args.seed, q_store=args.q_store, profile=args.profile is not None,
+                            layout=layout, config=Config.parse(args.set))
+    if args.resume:
+        course.load_checkpoint(args.resume)
+    if args.load:
+        course.load_best_creature(args.load)
+    if args.record_replays:
+        course.record_replays(args.record_replays)
+
+    screen = clock = None
+    if args.render_every:
+        import pygame
+        pygame.init()
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Genetic Algorithm + Reinforcement Learning Obstacle Course")
+        clock = pygame.time.Clock()
+
+    total_frames = 0
+    total_steps = 0
+    start = time.perf_counter()
+    for _ in range(args.generations):
+        generation_start = time.perf_counter()
+        if screen is not None and course.generation % args.render_every == 0:
+            frames, keep_rendering = run_rendered_generation(course, screen, clock, args.fps)
+            if not keep_rendering:
+                screen = None
+        else:
+            frames = course.run_generation()
+        steps = int(course.population.steps.sum())
+        memory = course.population.q.memory_report()
+        elapsed = time.perf_counter() - generation_start
+        total_frames += frames
+        total_steps += steps
+
+        print(f"Generation {course.generation}: best fitness {course.best_fitness:.4f}, "
+              f"reached goal {course.creatures_reached_goal}/{len(course.population)}, "
+              f"{frames} frames, {steps} steps in {elapsed:.2f}s, "
+              f"Q-Tables {memory['bytes'] / 2 ** 20:.1f} MB (dense {memory['dense_bytes'] / 2 ** 20:.1f} MB)")
+
+        course.evolve()
+        course.reset_population()
+        if args.checkpoint and args.checkpoint_every and course.generation % args.checkpoint_every == 0:
+            course.save_checkpoint(args.checkpoint, background=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"{args.generations} generations in {elapsed:.2f}s: "
+          f"{args.generations / elapsed:.3f} generations/sec, "
+          f"{total_frames / elapsed:.1f} frames/sec, "
+          f"{total_steps / elapsed:.0f} steps/sec")
+
+    autosaved = args.checkpoint_every and course.generation % args.checkpoint_every == 0
+    if args.checkpoint and not autosaved:
+        course.save_checkpoint(args.checkpoint, background=True)
+    # Waits for the checkpoints still being written
+    course.close()
+    if args.profile:
+        course.profiler.export(args.profile)
+    if args.save:
+        course.save_best_creature(args.save)
+
+    if args.render_every:
+        import pygame
+        pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
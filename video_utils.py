@@ -1,7 +1,10 @@
 import os
-import cv2
+import queue
+import threading
+import numpy as np
 from config import *
-import pygame
+
+# pygame and OpenCV are imported by the functions using them, so importing this module doesn't load SDL or OpenCV
 
 
 def ensure_dir(directory):
@@ -9,6 +12,7 @@ def ensure_dir(directory):
         os.makedirs(directory)
 
 def record_frame(screen, frame_number, directory):
+    import pygame
     # Create a new surface with the desired recording size
     scaled_surface = pygame.Surface((RECORD_WIDTH, RECORD_HEIGHT))
     # Scale down the screen surface to the recording size
@@ -17,6 +21,7 @@ def record_frame(screen, frame_number, directory):
     pygame.image.save(scaled_surface, f"{directory}/frame_{frame_number:08d}.png")
 
 def create_video(input_directory, output_filename, fps=60):
+    import cv2
     images = [img for img in os.listdir(input_directory) if img.endswith(".png")]
     images.sort()
 
@@ -36,4 +41,61 @@ def cleanup_frames(directory):
     for file in os.listdir(directory):
         os.remove(os.path.join(directory, file))
     os.rmdir(directory)
-    print(f"Cleaned up temporary frames in {directory}")
\ No newline at end of file
+    print(f"Cleaned up temporary frames in {directory}")
+
+
+# Records frames straight into a video file: frames are copied from the screen once
+# and converted, scaled and encoded on a background thread (no temporary files)
+class VideoRecorder:
+
+    def __init__(self, filename, fps=60, size=(RECORD_WIDTH, RECORD_HEIGHT), max_queued_frames=64):
+        self.filename = filename
+        self.fps = fps
+        self.size = size
+        self.frames = queue.Queue(maxsize=max_queued_frames)
+        self.error = None
+        self.frame_count = 0
+        self.thread = threading.Thread(target=self.write_frames, daemon=True)
+        self.thread.start()
+
+    # Queue a copy of the screen (waits if the encoder is max_queued_frames behind)
+    def record(self, screen):
+        if self.error is not None:
+            raise self.error
+        import pygame
+        width, height = screen.get_size()
+        frame = np.frombuffer(pygame.image.tobytes(screen, "RGB"), dtype=np.uint8).reshape(height, width, 3)
+        self.frames.put(frame)
+        self.frame_count += 1
+
+    # Background thread: encode the queued frames until close() is called
+    def write_frames(self):
+        video = None
+        try:
+            import cv2
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                if video is None:
+                    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                    video = cv2.VideoWriter(self.filename, fourcc, self.fps, self.size)
+                if (frame.shape[1], frame.shape[0]) != self.size:
+                    frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+                video.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+        except Exception as error:
+            self.error = error
+            # Keep draining so record() never blocks on a dead encoder
+            while self.frames.get() is not None:
+                pass
+        finally:
+            if video is not None:
+                video.release()
+
+    # Wait for every queued frame to be written and close the video file
+    def close(self):
+        self.frames.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        print(f"Video saved as {self.filename} ({self.frame_count} frames)")